@@ -0,0 +1,352 @@
+"""
+Benchmark Suite for the ML Pipeline
+Measures generator, tokenization, training, inference and model-load
+performance, appends results to a JSON history file and flags regressions
+against a stored baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HISTORY_PATH = "./bench_history.jsonl"
+BASELINE_PATH = "./bench_baseline.json"
+REGRESSION_THRESHOLD = 0.10  # Flag metrics more than 10% worse than baseline
+HOST_FIELDS = ("host", "cpu_count")  # Must match the baseline's for timings to be comparable
+
+GENERATOR_ROWS = 20_000
+TOKENIZE_TEXTS = 2_000
+TRAIN_STEPS = 20
+LATENCY_REPEATS = 50
+STARTUP_REPEATS = 5
+BATCH_SIZES = (8, 32)
+
+# ============================================
+# HELPERS
+# ============================================
+
+def timed(fn, repeats, warmup=2):
+    """Median and p99 wall time (ms) of fn() over repeats runs"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return statistics.median(timings), p99
+
+def lower_is_better(metric):
+    """Latency-style metrics regress upwards; throughput metrics downwards"""
+    return metric.endswith(("_ms", "_seconds"))
+
+def sample_texts(n):
+    """Dataset texts for inference/tokenization benchmarks"""
+    import train_classifier as tc
+    
+    dataset = tc.load_data()
+    texts = dataset['test']['text'] + dataset['train']['text']
+    return (texts * (n // len(texts) + 1))[:n]
+
+class Skip(Exception):
+    """Raised by a benchmark whose inputs (model, ONNX file, deps) are missing"""
+
+# ============================================
+# BENCHMARKS
+# ============================================
+
+def bench_generator():
+    """Synthetic email generation rows/sec (seeded, no I/O)"""
+    import generate_training_data as gen
+    
+    rng = random.Random(0)
+    start = time.perf_counter()
+    count = sum(1 for _ in gen.iter_emails(GENERATOR_ROWS // 4, rng=rng))
+    return {"generator_rows_per_sec": count / (time.perf_counter() - start)}
+
+def bench_corpus_stats():
+    """Corpus statistics rows/sec over generated record batches (no tokenizer)"""
+    import corpus_stats
+    
+    try:
+        batches = list(corpus_stats.generated_record_batches(GENERATOR_ROWS // 4))
+    except ImportError:
+        raise Skip("pyarrow not installed")
+    stats = corpus_stats.CorpusStats()
+    start = time.perf_counter()
+    for batch in batches:
+        stats.update(batch)
+    return {"corpus_stats_rows_per_sec": stats.rows / (time.perf_counter() - start)}
+
+def bench_tokenization():
+    """Tokenizer throughput on dataset texts (no padding)"""
+    import train_classifier as tc
+    
+    tokenizer = tc.load_tokenizer(tc.MODEL_NAME)
+    texts = sample_texts(TOKENIZE_TEXTS)
+    start = time.perf_counter()
+    encoded = tokenizer(texts, truncation=True, max_length=tc.MAX_LENGTH)
+    elapsed = time.perf_counter() - start
+    tokens = sum(len(ids) for ids in encoded['input_ids'])
+    return {
+        "tokenize_texts_per_sec": len(texts) / elapsed,
+        "tokenize_tokens_per_sec": tokens / elapsed,
+    }
+
+def bench_train():
+    """CPU training steps/sec over TRAIN_STEPS steps from MODEL_NAME"""
+    import tempfile
+    
+    import train_classifier as tc
+    from transformers import (
+        DataCollatorWithPadding,
+        DistilBertForSequenceClassification,
+        Trainer,
+        TrainingArguments,
+    )
+    
+    tokenizer = tc.load_tokenizer(tc.MODEL_NAME)
+    tokenized = tc.load_tokenized_dataset(tokenizer, dynamic_padding=True)
+    model = DistilBertForSequenceClassification.from_pretrained(
+        tc.MODEL_NAME, num_labels=tc.NUM_LABELS
+    )
+    with tempfile.TemporaryDirectory() as output_dir:
+        args = TrainingArguments(
+            output_dir=output_dir,
+            max_steps=TRAIN_STEPS,
+            per_device_train_batch_size=tc.BATCH_SIZE,
+            group_by_length=True,
+            length_column_name='length',
+            save_strategy="no",
+            report_to="none",
+            use_cpu=True,
+            disable_tqdm=True,
+        )
+        trainer = Trainer(
+            model=model,
+            args=args,
+            train_dataset=tokenized['train'],
+            data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=tc.PAD_TO_MULTIPLE_OF),
+        )
+        metrics = trainer.train().metrics
+    return {
+        "train_steps_per_sec": metrics["train_steps_per_second"],
+        "train_samples_per_sec": metrics["train_samples_per_second"],
+    }
+
+def bench_model_load():
+    """Cold load of the trained model and tokenizer from OUTPUT_DIR"""
+    import train_classifier as tc
+    from transformers import DistilBertForSequenceClassification
+    
+    if not os.path.isdir(tc.OUTPUT_DIR):
+        raise Skip(f"{tc.OUTPUT_DIR} not found (train first)")
+    start = time.perf_counter()
+    tc.load_tokenizer(tc.OUTPUT_DIR)
+    DistilBertForSequenceClassification.from_pretrained(tc.OUTPUT_DIR)
+    return {"model_load_seconds": time.perf_counter() - start}
+
+def bench_torch_inference():
+    """PyTorch single-email latency and batched throughput"""
+    import train_classifier as tc
+    
+    if not os.path.isdir(tc.OUTPUT_DIR):
+        raise Skip(f"{tc.OUTPUT_DIR} not found (train first)")
+    tc.load_model(tc.OUTPUT_DIR)
+    texts = sample_texts(max(BATCH_SIZES) * 4)
+    
+    # Uncached: these measure the model, not the prediction cache
+    p50, p99 = timed(lambda: tc.predict(texts[:1], use_cache=False), LATENCY_REPEATS)
+    results = {"torch_single_p50_ms": p50, "torch_single_p99_ms": p99}
+    for batch_size in BATCH_SIZES:
+        stats = tc.predict(texts, batch_size=batch_size, use_cache=False)['stats']
+        results[f"torch_batch{batch_size}_texts_per_sec"] = stats['texts_per_sec']
+    return results
+
+def bench_onnx_inference():
+    """ONNX Runtime single-email latency and batched throughput"""
+    import train_classifier as tc
+    
+    if not os.path.exists(tc.ONNX_PATH):
+        raise Skip(f"{tc.ONNX_PATH} not found (run export first)")
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        raise Skip("onnxruntime not installed")
+    from onnx_session import load_session
+    
+    tokenizer = tc.load_tokenizer(tc.OUTPUT_DIR)
+    # The settings serve.py and bulk_classify.py would use on this host
+    session = load_session(tc.ONNX_PATH)
+    texts = sample_texts(max(BATCH_SIZES) * 4)
+    
+    def run(batch):
+        session.classify(tokenizer, batch)
+    
+    p50, p99 = timed(lambda: run(texts[:1]), LATENCY_REPEATS)
+    results = {"onnx_single_p50_ms": p50, "onnx_single_p99_ms": p99}
+    for batch_size in BATCH_SIZES:
+        start = time.perf_counter()
+        for offset in range(0, len(texts), batch_size):
+            run(texts[offset:offset + batch_size])
+        results[f"onnx_batch{batch_size}_texts_per_sec"] = len(texts) / (time.perf_counter() - start)
+    return results
+
+def bench_cli_startup():
+    """Fresh-interpreter time to import train_classifier and to print --help"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    def run(args):
+        subprocess.run([sys.executable, *args], cwd=script_dir, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    import_ms, _ = timed(lambda: run(["-c", "import train_classifier"]), STARTUP_REPEATS, warmup=1)
+    help_ms, _ = timed(lambda: run(["train_classifier.py", "--help"]), STARTUP_REPEATS, warmup=1)
+    return {
+        "cli_import_seconds": import_ms / 1000,
+        "cli_help_seconds": help_ms / 1000,
+    }
+
+BENCHMARKS = {
+    "cli_startup": bench_cli_startup,
+    "generator": bench_generator,
+    "corpus_stats": bench_corpus_stats,
+    "tokenization": bench_tokenization,
+    "train": bench_train,
+    "model_load": bench_model_load,
+    "torch_inference": bench_torch_inference,
+    "onnx_inference": bench_onnx_inference,
+}
+
+# ============================================
+# HISTORY AND BASELINE
+# ============================================
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(names):
+    """Run the named benchmarks, returning (metrics, skipped)"""
+    metrics, skipped = {}, {}
+    for name in names:
+        print(f"Running {name}...")
+        try:
+            results = BENCHMARKS[name]()
+        except Skip as e:
+            print(f"  skipped: {e}")
+            skipped[name] = str(e)
+            continue
+        for metric, value in results.items():
+            print(f"  {metric}: {value:,.3f}")
+        metrics.update(results)
+    return metrics, skipped
+
+def compare_to_baseline(metrics, baseline, threshold=REGRESSION_THRESHOLD):
+    """Metrics more than `threshold` worse than baseline, as a list of dicts"""
+    regressions = []
+    for metric, value in metrics.items():
+        base = baseline.get(metric)
+        if not base:
+            continue
+        change = (value - base) / base
+        worse = change > threshold if lower_is_better(metric) else change < -threshold
+        if worse:
+            regressions.append({"metric": metric, "baseline": base, "value": value, "change": change})
+    return regressions
+
+def host_mismatch(record, baseline):
+    """HOST_FIELDS whose value differs between this run and the baseline"""
+    return [field for field in HOST_FIELDS if baseline.get(field) != record.get(field)]
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ML pipeline benchmark suite")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS),
+                        help="Run only these benchmarks")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run's metrics as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative change that counts as a regression")
+    parser.add_argument("--any-host", action="store_true",
+                        help="Compare against a baseline recorded on a different host")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    print("=" * 50)
+    print("ML Pipeline Benchmarks")
+    print("=" * 50)
+    
+    metrics, skipped = run_benchmarks(args.only or list(BENCHMARKS))
+    
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "metrics": metrics,
+        "skipped": skipped,
+    }
+    with open(HISTORY_PATH, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"\nAppended results to {HISTORY_PATH}")
+    
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(record, f, indent=2)
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return 0
+    
+    if not os.path.exists(BASELINE_PATH):
+        print(f"No baseline at {BASELINE_PATH}; run with --save-baseline to create one")
+        return 0
+    
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    mismatch = host_mismatch(record, baseline)
+    if mismatch:
+        print("\n" + "!" * 50)
+        print(f"WARNING: baseline was recorded on a different host "
+              f"({', '.join(f'{k} {baseline.get(k)!r} vs {record[k]!r}' for k in mismatch)})")
+        print("!" * 50)
+        if not args.any_host:
+            print("Skipping the comparison; re-record with --save-baseline, "
+                  "or pass --any-host to compare anyway")
+            return 0
+    regressions = compare_to_baseline(metrics, baseline["metrics"], args.threshold)
+    if not regressions:
+        print(f"No regressions vs baseline ({baseline.get('commit')}, {baseline['timestamp']})")
+        return 0
+    
+    print(f"\nREGRESSIONS vs baseline ({baseline.get('commit')}, {baseline['timestamp']}):")
+    for r in regressions:
+        print(f"  {r['metric']}: {r['baseline']:,.3f} -> {r['value']:,.3f} ({r['change']:+.1%})")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
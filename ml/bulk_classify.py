@@ -0,0 +1,390 @@
+"""
+Bulk Email Classification over Mail Exports
+Streams an mbox file or a JSONL export, extracts subject and body, and
+classifies every message with the ONNX export in a thread pool. Results are
+written to JSONL or Parquet with label, confidence and model version.
+
+Usage:
+    python bulk_classify.py mail.mbox --output classified.jsonl
+    python bulk_classify.py gmail_export.jsonl --output classified.parquet
+    python train_classifier.py classify [bulk_classify.py options]
+
+Memory is bounded by the message window, not the mailbox: messages are
+parsed one at a time, and at most two windows of WINDOW_BATCHES batches are in
+flight. Within a window, messages are sorted by length before batching, so
+padding stays small.
+"""
+
+import argparse
+import base64
+import html
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.header import decode_header, make_header
+from email.parser import BytesParser
+
+import numpy as np
+
+import train_classifier as tc
+from instrumentation import peak_rss_mb
+from onnx_session import ClassifierSession, session_config
+from prediction_cache import model_version
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+ONNX_MODEL_PATH = tc.ONNX_PATH
+TOKENIZER_PATH = tc.OUTPUT_DIR
+OUTPUT_PATH = "./classified.jsonl"
+BATCH_SIZE = 64  # Messages per ONNX Runtime call
+WINDOW_BATCHES = 16  # Batches per length-sorted window
+WORKERS = min(4, os.cpu_count() or 1)  # Inference threads sharing one session
+MAX_MESSAGE_BYTES = 1 << 20  # Longer messages (attachments) are cut before parsing
+MAX_TEXT_CHARS = tc.MAX_LENGTH * 8  # Per chunk; text past this is truncated by the tokenizer anyway
+WRITE_BATCH_SIZE = 10_000  # Rows per Parquet row group
+PROGRESS_EVERY = 10_000
+
+_ESCAPED_FROM = re.compile(rb"^>+From ")
+_HTML_SKIP = re.compile(r"<(script|style)[^>]*>.*?</\1>", re.IGNORECASE | re.DOTALL)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+
+# ============================================
+# READING
+# ============================================
+
+def iter_mbox(path, max_message_bytes=MAX_MESSAGE_BYTES):
+    """Raw messages of an mbox file, read line by line (one message in memory)"""
+    lines, size, previous_blank = [], 0, True
+    with open(path, "rb") as f:
+        for line in f:
+            if previous_blank and line.startswith(b"From "):
+                if lines:
+                    yield b"".join(lines)
+                lines, size, previous_blank = [], 0, False
+                continue
+            previous_blank = line in (b"\n", b"\r\n")
+            if size < max_message_bytes:
+                # mboxrd: body lines starting with "From " are stored as ">From "
+                if _ESCAPED_FROM.match(line):
+                    line = line[1:]
+                lines.append(line)
+                size += len(line)
+    if lines:
+        yield b"".join(lines)
+
+def html_to_text(markup):
+    text = _HTML_TAG.sub(" ", _HTML_SKIP.sub(" ", markup))
+    return _WHITESPACE.sub(" ", html.unescape(text))
+
+def _header(message, name):
+    """Decoded header value (RFC 2047 encoded words), "" when missing"""
+    value = message.get(name)
+    if value is None:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, ValueError, UnicodeError):  # Unknown charset, malformed encoding
+        return str(value)
+
+def _text_part(message):
+    """First inline text/plain part, else the first text/html one"""
+    html_part = None
+    for part in message.walk():
+        if part.is_multipart() or part.get_filename():
+            continue
+        if part.get("content-disposition", "").lower().startswith("attachment"):
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain":
+            return part
+        if content_type == "text/html" and html_part is None:
+            html_part = part
+    return html_part
+
+def parse_message(raw):
+    """id, from, date, subject and plain-text body of an RFC 822 message
+    
+    Uses the compat32 parser with explicit header decoding: about 5x faster
+    than policy.default, whose header objects dominate parsing time.
+    """
+    message = BytesParser(policy=policy.compat32).parsebytes(raw)
+    body = ""
+    part = _text_part(message)
+    if part is not None:
+        payload = part.get_payload(decode=True) or b""
+        try:
+            body = payload.decode(part.get_content_charset() or "utf-8", "replace")
+        except LookupError:  # Unknown charset
+            body = payload.decode("utf-8", "replace")
+        if part.get_content_type() == "text/html":
+            body = html_to_text(body)
+    return {
+        "id": _header(message, "message-id"),
+        "from": _header(message, "from"),
+        "date": _header(message, "date"),
+        "subject": _header(message, "subject"),
+        "body": body,
+    }
+
+def parse_jsonl_record(record):
+    """Message from a JSONL record: Gmail API `raw` (base64url RFC 822) or plain fields"""
+    if "raw" in record:
+        message = parse_message(base64.urlsafe_b64decode(record["raw"] + "=" * (-len(record["raw"]) % 4)))
+        message["id"] = str(record.get("id") or message["id"])
+        return message
+    return {
+        "id": str(record.get("id", "")),
+        "from": str(record.get("from", "")),
+        "date": str(record.get("date", "")),
+        "subject": str(record.get("subject", "")),
+        "body": str(record.get("body") or record.get("text") or record.get("snippet") or ""),
+    }
+
+def iter_messages(path):
+    """Parsed messages of an mbox or JSONL (.jsonl/.ndjson/.json) file; None for unreadable ones"""
+    if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json"):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield parse_jsonl_record(json.loads(line))
+                except (ValueError, TypeError, AttributeError):
+                    yield None
+    else:
+        for raw in iter_mbox(path):
+            try:
+                yield parse_message(raw)
+            except Exception:  # email parsing can fail in many ways on real mailboxes
+                yield None
+
+def email_text(message, sliding_window=False):
+    """Model input in the training data's layout"""
+    max_chars = MAX_TEXT_CHARS * (tc.MAX_CHUNKS if sliding_window else 1)
+    return f"Subject: {message['subject']}\n\n{message['body']}"[:max_chars]
+
+# ============================================
+# INFERENCE
+# ============================================
+
+class OnnxClassifier:
+    """ONNX Runtime session shared by the worker threads (run() is thread-safe)"""
+    
+    def __init__(self, onnx_path=ONNX_MODEL_PATH, tokenizer_path=TOKENIZER_PATH, workers=WORKERS,
+                 sliding_window=False):
+        self.sliding_window = sliding_window
+        config = session_config(onnx_path)
+        # Split the (tuned) threads between the worker threads instead of oversubscribing
+        config['intra_op_threads'] = max(1, config['intra_op_threads'] // workers)
+        self.session = ClassifierSession(onnx_path, config)
+        self.tokenizer = tc.load_tokenizer(tokenizer_path)
+    
+    def __call__(self, texts):
+        """Probabilities, shape (len(texts), NUM_LABELS)"""
+        return self.session.classify(self.tokenizer, texts, self.sliding_window)
+
+def classify_window(pool, classifier, messages, batch_size):
+    """Submit a window of messages in length-sorted batches; returns the futures"""
+    texts = [email_text(m, classifier.sliding_window) for m in messages]
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    futures = []
+    for offset in range(0, len(order), batch_size):
+        batch = order[offset:offset + batch_size]
+        futures.append((batch, pool.submit(classifier, [texts[i] for i in batch])))
+    return futures
+
+def collect_window(messages, futures, version):
+    """Result rows for a window, in input order"""
+    probabilities = [None] * len(messages)
+    for batch, future in futures:
+        for i, row in zip(batch, future.result()):
+            probabilities[i] = row
+    rows = []
+    for message, row in zip(messages, probabilities):
+        label_id = int(np.argmax(row))
+        rows.append({
+            "id": message["id"],
+            "from": message["from"],
+            "date": message["date"],
+            "subject": message["subject"],
+            "label": tc.LABEL_NAMES[label_id],
+            "label_id": label_id,
+            "confidence": float(row[label_id]),
+            "probabilities": [round(float(p), 4) for p in row],
+            "model_version": version,
+        })
+    return rows
+
+# ============================================
+# OUTPUT
+# ============================================
+
+class ResultWriter:
+    """JSONL or Parquet (by extension) writer for result rows"""
+    
+    def __init__(self, path, batch_size=WRITE_BATCH_SIZE):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.batch_size = batch_size
+        self.pending = []
+        self._writer = None
+        if not self.parquet:
+            self._file = open(path, "w", encoding="utf-8")
+    
+    def write(self, rows):
+        if not self.parquet:
+            self._file.write("".join(json.dumps(row) + "\n" for row in rows))
+            return
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        if not self.pending:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        schema = pa.schema([
+            ("id", pa.string()), ("from", pa.string()), ("date", pa.string()),
+            ("subject", pa.string()),
+            ("label", pa.dictionary(pa.int8(), pa.string())), ("label_id", pa.int8()),
+            ("confidence", pa.float32()), ("probabilities", pa.list_(pa.float32())),
+            ("model_version", pa.string()),
+        ])
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+        self._writer.write_table(pa.Table.from_pylist(self.pending, schema=schema))
+        self.pending = []
+    
+    def close(self):
+        if self.parquet:
+            self.flush()
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+# ============================================
+# PIPELINE
+# ============================================
+
+def classify_export(input_path, output_path=OUTPUT_PATH, onnx_path=ONNX_MODEL_PATH,
+                    tokenizer_path=TOKENIZER_PATH, batch_size=BATCH_SIZE, workers=WORKERS,
+                    limit=None, sliding_window=tc.SLIDING_WINDOW):
+    """Classify every message of input_path into output_path; returns summary stats
+    
+    The main thread parses the next window while the pool runs the previous
+    one, so parsing and inference overlap.
+    """
+    version = model_version(onnx_path, extra=tc.inference_signature(sliding_window))
+    classifier = OnnxClassifier(onnx_path, tokenizer_path, workers, sliding_window)
+    window_size = batch_size * WINDOW_BATCHES
+    labels = Counter()
+    messages_in = skipped = written = 0
+    
+    print(f"Classifying {input_path} with {onnx_path} (model version {version}, {workers} workers)")
+    start = time.perf_counter()
+    writer = ResultWriter(output_path)
+    
+    def drain(in_flight):
+        nonlocal written
+        rows = collect_window(*in_flight, version)
+        writer.write(rows)
+        labels.update(row["label"] for row in rows)
+        previous = written
+        written += len(rows)
+        if written // PROGRESS_EVERY > previous // PROGRESS_EVERY:
+            elapsed = time.perf_counter() - start
+            print(f"  {written:,} messages, {written / elapsed:,.0f} messages/sec, "
+                  f"peak RSS {peak_rss_mb() or 0:.0f} MB")
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="classify") as pool:
+            in_flight = None
+            window = []
+            for message in iter_messages(input_path):
+                if limit and messages_in >= limit:
+                    break
+                messages_in += 1
+                if message is None or not (message["subject"] or message["body"]).strip():
+                    skipped += 1
+                    continue
+                window.append(message)
+                if len(window) >= window_size:
+                    futures = classify_window(pool, classifier, window, batch_size)
+                    if in_flight:
+                        drain(in_flight)
+                    in_flight, window = (window, futures), []
+            if window:
+                futures = classify_window(pool, classifier, window, batch_size)
+                if in_flight:
+                    drain(in_flight)
+                in_flight = (window, futures)
+            if in_flight:
+                drain(in_flight)
+    finally:
+        writer.close()
+    seconds = time.perf_counter() - start
+    
+    stats = {
+        "input": input_path,
+        "output": output_path,
+        "model_version": version,
+        "messages": messages_in,
+        "classified": written,
+        "skipped": skipped,
+        "seconds": seconds,
+        "messages_per_sec": written / seconds if seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "labels": dict(labels),
+    }
+    print(f"\n{written:,} messages classified in {seconds:.1f}s "
+          f"({stats['messages_per_sec'] or 0:,.0f} messages/sec), {skipped:,} skipped")
+    print("  " + ", ".join(f"{name} {labels[name]:,}" for name in tc.LABEL_NAMES))
+    print(f"  peak RSS {stats['peak_rss_mb'] or 0:.0f} MB")
+    print(f"Results saved to {output_path}")
+    return stats
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classify an mbox or JSONL mail export")
+    parser.add_argument("input", help="mbox file, or .jsonl with subject/body, text or Gmail `raw` fields")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Results file (.jsonl or .parquet)")
+    parser.add_argument("--model", default=ONNX_MODEL_PATH, help="ONNX model")
+    parser.add_argument("--tokenizer", default=TOKENIZER_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Inference threads")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after N messages")
+    parser.add_argument("--sliding-window", action="store_true", default=tc.SLIDING_WINDOW,
+                        help="Classify long emails in overlapping chunks instead of truncating")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    print("=" * 50)
+    print("Bulk Email Classification")
+    print("=" * 50)
+    
+    for path in (args.input, args.model):
+        if not os.path.exists(path):
+            print(f"{path} not found", file=sys.stderr)
+            return 1
+    classify_export(args.input, args.output, args.model, args.tokenizer,
+                    args.batch_size, args.workers, args.limit, args.sliding_window)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
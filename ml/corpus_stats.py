@@ -0,0 +1,386 @@
+"""
+Corpus Statistics for the Email Dataset
+Single-pass summary of a CSV/Parquet/Arrow corpus, or of rows streamed
+straight from the generator: class balance, per-class length histograms,
+token-length percentiles against MAX_LENGTH, vocabulary size and template
+coverage.
+
+Lengths and word counts are computed with Arrow compute kernels per record
+batch and accumulated as per-class bincounts, so memory stays flat and
+multi-million-row files take seconds. Token lengths come from a uniform
+sample of SAMPLE_SIZE rows run through the tokenizer; the share of the whole
+corpus truncated at MAX_LENGTH is extrapolated from per-class tokens-per-word.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+
+import numpy as np
+
+import generate_training_data as gen
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+DATASET_PATH = "./job_emails_dataset.csv"
+REPORT_PATH = "./corpus_stats.json"
+TOKENIZER_PATH = "./model_output"  # Falls back to train_classifier.MODEL_NAME
+
+READ_BATCH_SIZE = 65_536  # Rows per record batch (Parquet/Arrow)
+CSV_BLOCK_SIZE = 16 << 20  # Bytes per CSV block
+MAX_CHARS = 16_384  # Longer emails are counted in the last bin
+MAX_WORDS = 4_096
+HISTOGRAM_BIN_CHARS = 250
+SAMPLE_SIZE = 5_000  # Rows tokenized for token-length statistics
+PERCENTILES = (50, 90, 95, 99, 100)
+TOKEN_BINS = (64, 128, 192, 256, 384, 512)
+
+# ============================================
+# READING
+# ============================================
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("corpus_stats.py requires pyarrow: pip install pyarrow") from e
+    return pa
+
+def iter_record_batches(path, batch_size=READ_BATCH_SIZE):
+    """Record batches of a CSV, Parquet or Arrow IPC stream file"""
+    pa = _import_pyarrow()
+    fmt = gen.output_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    elif fmt == "arrow":
+        yield from pa.ipc.open_stream(pa.memory_map(path))
+    else:
+        import pyarrow.csv as pcsv
+        # Email bodies span several lines inside quoted fields
+        yield from pcsv.open_csv(
+            path,
+            read_options=pcsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            parse_options=pcsv.ParseOptions(newlines_in_values=True),
+        )
+
+def generated_record_batches(num_per_category, seed=0, batch_size=gen.WRITE_BATCH_SIZE):
+    """Record batches streamed from the generator, without writing a file"""
+    pa = _import_pyarrow()
+    schema = gen.arrow_schema(pa)
+    rows = gen.iter_emails(num_per_category, rng=random.Random(seed))
+    for batch in gen.iter_batches(rows, batch_size):
+        yield gen.to_record_batch(pa, batch, schema)
+
+# ============================================
+# ACCUMULATION
+# ============================================
+
+def _percentiles(counts, percentiles=PERCENTILES):
+    """Percentiles of the values whose histogram (one bin per value) is counts"""
+    total = counts.sum()
+    if not total:
+        return {f"p{p}": None for p in percentiles}
+    cumulative = np.cumsum(counts)
+    return {f"p{p}": int(np.searchsorted(cumulative, total * p / 100)) for p in percentiles}
+
+class CorpusStats:
+    """Per-class length bincounts, template counts and a uniform text sample
+    
+    The sample is a bottom-k sketch: every row gets a random key and the
+    sample_size smallest keys seen so far are kept, so it is uniform over
+    the stream without knowing its length in advance.
+    """
+    
+    def __init__(self, num_labels=len(gen.CATEGORY_NAMES), sample_size=SAMPLE_SIZE, seed=0):
+        self.num_labels = num_labels
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.chars = np.zeros((num_labels, MAX_CHARS + 1), dtype=np.int64)
+        self.words = np.zeros((num_labels, MAX_WORDS + 1), dtype=np.int64)
+        self.group_column = None
+        self.groups = Counter()
+        self.group_labels = {}
+        self.sample_keys = np.empty(0)
+        self.sample_texts = []
+        self.sample_labels = np.empty(0, dtype=np.int64)
+        self.sample_words = np.empty(0, dtype=np.int64)
+    
+    def _bincount(self, labels, values, max_value):
+        flat = labels * (max_value + 1) + np.minimum(values, max_value)
+        return np.bincount(flat, minlength=self.num_labels * (max_value + 1)).reshape(self.num_labels, -1)
+    
+    def update(self, batch):
+        """Add one Arrow record batch (needs text and label columns)"""
+        import pyarrow.compute as pc
+        
+        n = batch.num_rows
+        if not n:
+            return
+        names = batch.schema.names
+        text = pc.fill_null(batch.column(names.index("text")), "")
+        labels = batch.column(names.index("label")).to_numpy(zero_copy_only=False).astype(np.int64)
+        if labels.min() < 0 or labels.max() >= self.num_labels:
+            raise ValueError(f"labels must be in [0, {self.num_labels}), got {labels.min()}..{labels.max()}")
+        chars = pc.utf8_length(text).to_numpy(zero_copy_only=False).astype(np.int64)
+        # ASCII whitespace only: twice as fast as utf8_split_whitespace
+        words = pc.list_value_length(pc.ascii_split_whitespace(text)).to_numpy(zero_copy_only=False).astype(np.int64)
+        
+        self.chars += self._bincount(labels, chars, MAX_CHARS)
+        self.words += self._bincount(labels, words, MAX_WORDS)
+        self.rows += n
+        
+        column = next((c for c in ("template", "cluster") if c in names), None)
+        if column is not None:
+            self.group_column = self.group_column or column
+            self._count_groups(batch.column(names.index(column)), batch.column(names.index("label")))
+        self._sample(text, labels, words)
+    
+    def _count_groups(self, groups, labels):
+        import pyarrow as pa
+        
+        if pa.types.is_dictionary(groups.type):
+            groups = groups.cast(groups.type.value_type)
+        # Hash aggregation in Arrow; templates never span labels, so min is the label
+        table = pa.table({"group": groups, "label": labels})
+        for item in table.group_by("group").aggregate([("label", "min"), ("label", "count")]).to_pylist():
+            self.groups[item["group"]] += item["label_count"]
+            self.group_labels.setdefault(item["group"], int(item["label_min"]))
+    
+    def _sample(self, text, labels, words):
+        keys = self.rng.random(len(labels))
+        if len(self.sample_keys) >= self.sample_size:
+            # Only rows that beat the current k-th smallest key can enter
+            cutoff = self.sample_keys.max()
+            candidates = np.flatnonzero(keys < cutoff)
+        else:
+            candidates = np.arange(len(labels))
+        if not len(candidates):
+            return
+        
+        keys = np.concatenate([self.sample_keys, keys[candidates]])
+        texts = self.sample_texts + text.take(candidates).to_pylist()
+        sample_labels = np.concatenate([self.sample_labels, labels[candidates]])
+        sample_words = np.concatenate([self.sample_words, words[candidates]])
+        keep = np.argsort(keys)[:self.sample_size]
+        self.sample_keys = keys[keep]
+        self.sample_texts = [texts[i] for i in keep]
+        self.sample_labels = sample_labels[keep]
+        self.sample_words = sample_words[keep]
+
+# ============================================
+# REPORT
+# ============================================
+
+def _histogram(counts, bin_width=HISTOGRAM_BIN_CHARS):
+    """Fixed-width histogram from a one-bin-per-value count array"""
+    padded = np.pad(counts, (0, -len(counts) % bin_width))
+    binned = padded.reshape(-1, bin_width).sum(axis=1)
+    last = max(int(np.flatnonzero(binned)[-1]) + 1, 1) if binned.any() else 1
+    return [{"from": i * bin_width, "count": int(c)} for i, c in enumerate(binned[:last])]
+
+def token_stats(stats, tokenizer, max_length):
+    """Token-length percentiles, truncation share and vocabulary from the sample"""
+    if not stats.sample_texts:
+        return None
+    encoded = tokenizer(stats.sample_texts, truncation=False, verbose=False)['input_ids']
+    lengths = np.array([len(ids) for ids in encoded])
+    bins = [0, *TOKEN_BINS, np.inf]
+    
+    def summary(mask, label=None):
+        n = int(mask.sum())
+        if not n:
+            return None
+        token_lengths = lengths[mask]
+        tokens_per_word = token_lengths.sum() / max(stats.sample_words[mask].sum(), 1)
+        # Corpus-wide truncation estimate: rows whose word count implies > max_length tokens
+        words = stats.words.sum(axis=0) if label is None else stats.words[label]
+        max_words = int(max_length / tokens_per_word)
+        vocab = {token for i in np.flatnonzero(mask) for token in encoded[i]}
+        return {
+            "sample_rows": n,
+            **{f"p{p}": float(np.percentile(token_lengths, p)) for p in PERCENTILES},
+            "mean": float(token_lengths.mean()),
+            "truncated_share": float((token_lengths > max_length).mean()),
+            "tokens_per_word": float(tokens_per_word),
+            "estimated_truncated_share": float(words[max_words + 1:].sum() / max(words.sum(), 1)),
+            "vocab_size": len(vocab),
+            "histogram": {
+                f"{bins[i]}-{bins[i + 1]}": int(c)
+                for i, c in enumerate(np.histogram(token_lengths, bins=bins)[0])
+            },
+        }
+    
+    return {
+        "max_length": max_length,
+        "tokenizer_vocab_size": tokenizer.vocab_size,
+        "all": summary(np.ones(len(lengths), dtype=bool)),
+        "per_label": {
+            gen.CATEGORY_NAMES[label]: summary(stats.sample_labels == label, label)
+            for label in range(stats.num_labels)
+        },
+    }
+
+def template_coverage(stats):
+    """Rows per template (or dedup cluster), and coverage of the generator's templates"""
+    if not stats.groups:
+        return None
+    sizes = np.array(list(stats.groups.values()))
+    per_label = Counter(stats.group_labels[g] for g in stats.groups)
+    coverage = {
+        "column": stats.group_column,
+        "groups": len(sizes),
+        "rows_per_group": {"min": int(sizes.min()), "median": float(np.median(sizes)), "max": int(sizes.max())},
+        "groups_per_label": {gen.CATEGORY_NAMES[label]: per_label[label] for label in range(stats.num_labels)},
+    }
+    if stats.group_column == "template":
+        defined = {
+            f"{gen.CATEGORY_NAMES[label]}/{i}"
+            for templates, label in gen.CATEGORY_TEMPLATES for i in range(len(templates))
+        }
+        seen = defined & set(stats.groups)
+        coverage.update({
+            "defined_templates": len(defined),
+            "coverage": len(seen) / len(defined),
+            "missing_templates": sorted(defined - seen),
+        })
+    return coverage
+
+def build_report(stats, source, seconds, tokenizer=None, max_length=256):
+    counts = stats.chars.sum(axis=1)
+    nonzero = counts[counts > 0]
+    return {
+        "source": source,
+        "rows": stats.rows,
+        "seconds": seconds,
+        "rows_per_sec": stats.rows / seconds if seconds else None,
+        "class_balance": {
+            "counts": {gen.CATEGORY_NAMES[label]: int(c) for label, c in enumerate(counts)},
+            "shares": {gen.CATEGORY_NAMES[label]: float(c / max(stats.rows, 1)) for label, c in enumerate(counts)},
+            "imbalance_ratio": float(nonzero.max() / nonzero.min()) if len(nonzero) else None,
+        },
+        "chars": {
+            gen.CATEGORY_NAMES[label]: {**_percentiles(stats.chars[label]),
+                                        "histogram": _histogram(stats.chars[label])}
+            for label in range(stats.num_labels)
+        },
+        "words": {gen.CATEGORY_NAMES[label]: _percentiles(stats.words[label])
+                  for label in range(stats.num_labels)},
+        "tokens": token_stats(stats, tokenizer, max_length) if tokenizer else None,
+        "templates": template_coverage(stats),
+    }
+
+def print_report(report):
+    print(f"\n{report['rows']:,} rows in {report['seconds']:.2f}s "
+          f"({report['rows_per_sec'] or 0:,.0f} rows/sec)")
+    
+    balance = report["class_balance"]
+    tokens = report["tokens"]
+    print(f"\n{'label':<10} {'rows':>10} {'share':>7} {'chars p50':>10} {'p99':>7}"
+          + (f" {'tokens p50':>11} {'p95':>5} {'p99':>5} {'truncated':>10}" if tokens else ""))
+    for category in gen.CATEGORY_NAMES:
+        chars = report["chars"][category]
+        line = (f"{category:<10} {balance['counts'][category]:>10,} {balance['shares'][category]:>7.1%} "
+                f"{chars['p50'] or 0:>10} {chars['p99'] or 0:>7}")
+        t = tokens and tokens["per_label"][category]
+        if t:
+            line += (f" {t['p50']:>11.0f} {t['p95']:>5.0f} {t['p99']:>5.0f} "
+                     f"{t['estimated_truncated_share']:>10.2%}")
+        print(line)
+    if balance["imbalance_ratio"]:
+        print(f"Imbalance ratio (largest / smallest class): {balance['imbalance_ratio']:.2f}")
+    
+    if tokens:
+        overall = tokens["all"]
+        print(f"\nToken lengths ({overall['sample_rows']:,}-row sample, MAX_LENGTH {tokens['max_length']}):")
+        peak = max(overall["histogram"].values()) or 1
+        for bucket, count in overall["histogram"].items():
+            print(f"  {bucket:>10} {count:>7,} {'#' * round(40 * count / peak)}")
+        print(f"  {overall['truncated_share']:.2%} of sampled emails exceed MAX_LENGTH; "
+              f"vocabulary {overall['vocab_size']:,} of {tokens['tokenizer_vocab_size']:,} tokens")
+    
+    templates = report["templates"]
+    if templates:
+        sizes = templates["rows_per_group"]
+        print(f"\n{templates['groups']:,} {templates['column']} groups, rows per group "
+              f"min {sizes['min']:,} / median {sizes['median']:,.0f} / max {sizes['max']:,}")
+        if "coverage" in templates:
+            print(f"Template coverage: {templates['coverage']:.1%} of {templates['defined_templates']} "
+                  f"generator templates")
+            if templates["missing_templates"]:
+                print(f"  missing: {', '.join(templates['missing_templates'])}")
+
+def load_stats_tokenizer(path):
+    """Tokenizer for token statistics, or None when it can't be loaded"""
+    import train_classifier as tc
+    
+    for candidate in (path, tc.MODEL_NAME):
+        if candidate and (os.path.isdir(candidate) or candidate == tc.MODEL_NAME):
+            try:
+                return tc.load_tokenizer(candidate)
+            except (OSError, ValueError) as e:
+                print(f"Could not load tokenizer {candidate}: {e}")
+    return None
+
+def corpus_stats(batches, source, tokenizer=None, sample_size=SAMPLE_SIZE, report_path=REPORT_PATH,
+                 seed=0):
+    """Summarize a stream of record batches; returns the report dict"""
+    import train_classifier as tc
+    
+    stats = CorpusStats(sample_size=sample_size, seed=seed)
+    start = time.perf_counter()
+    for batch in batches:
+        stats.update(batch)
+    seconds = time.perf_counter() - start
+    
+    report = build_report(stats, source, seconds, tokenizer, tc.MAX_LENGTH)
+    print_report(report)
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {report_path}")
+    return report
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Corpus statistics and label-balance report")
+    parser.add_argument("input", nargs="?", default=DATASET_PATH, help="CSV, .parquet or .arrow dataset")
+    parser.add_argument("--generate", type=int, metavar="N", default=0,
+                        help="Summarize N generated emails per category instead of a file")
+    parser.add_argument("--seed", type=int, default=0, help="Generator and sampling seed")
+    parser.add_argument("--tokenizer", default=TOKENIZER_PATH,
+                        help="Tokenizer for token-length statistics")
+    parser.add_argument("--no-tokens", action="store_true", help="Skip token statistics")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE,
+                        help="Rows tokenized for token statistics")
+    parser.add_argument("--report", default=REPORT_PATH)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    print("=" * 50)
+    print("Corpus Statistics")
+    print("=" * 50)
+    
+    tokenizer = None if args.no_tokens else load_stats_tokenizer(args.tokenizer)
+    if args.generate:
+        source = f"generator ({args.generate:,} per category, seed {args.seed})"
+        batches = generated_record_batches(args.generate, args.seed)
+    else:
+        source = args.input
+        batches = iter_record_batches(args.input)
+    print(f"Reading {source}...")
+    corpus_stats(batches, source, tokenizer, args.sample_size, args.report, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Near-Duplicate Detection and Dedup for the Email Corpus
+Streams a CSV/Parquet/Arrow dataset, clusters near-identical emails with
+MinHash + LSH (word 3-gram shingles), drops exact duplicates, caps each
+near-duplicate cluster and reports the compression ratio.
+
+The synthetic corpus has a few templates per class, so nearly every email has
+hundreds of near-duplicates that differ only in company, role and dates.
+Cluster ids also back the template-grouped train/test split in
+train_classifier.py when a dataset has no template column.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+DATASET_PATH = "./job_emails_dataset.csv"
+OUTPUT_PATH = "./job_emails_dedup.csv"
+REPORT_PATH = "./dedup_report.json"
+
+SHINGLE_SIZE = 3  # Words per shingle
+NUM_PERM = 128  # MinHash signature length
+LSH_BANDS = 64  # 64 bands x 2 rows: pairs above ~0.3 Jaccard almost always collide
+JACCARD_THRESHOLD = 0.3  # Estimated Jaccard to join a cluster (same template 0.4-1.0, others < 0.15)
+MAX_PER_CLUSTER = 100  # Rows kept per near-duplicate cluster
+READ_BATCH_SIZE = 10_000
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+")
+
+# ============================================
+# MINHASH + LSH
+# ============================================
+
+def shingles(text, size=SHINGLE_SIZE):
+    """32-bit hashes of the lowercased word n-grams of text"""
+    words = _WORD.findall(text.lower())
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+class MinHasher:
+    """MinHash signatures from NUM_PERM universal hash functions (a*x + b mod p)"""
+    
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # a, b < 2^32 and x < 2^32 keep a*x + b below 2^64 (no uint64 overflow)
+        self.a = rng.integers(1, _MAX_HASH, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MAX_HASH, num_perm, dtype=np.uint64)
+    
+    def signature(self, text):
+        hashes = shingles(text)[:, None]
+        return ((hashes * self.a + self.b) % _MERSENNE_PRIME & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+class NearDuplicateIndex:
+    """Streaming clustering: each email joins the most similar existing cluster
+    
+    Only the first email of each cluster (its representative) is indexed, so
+    memory grows with the number of clusters rather than rows. Candidates
+    come from LSH band collisions and are confirmed by the estimated Jaccard
+    similarity of the signatures.
+    """
+    
+    def __init__(self, threshold=JACCARD_THRESHOLD, num_perm=NUM_PERM, bands=LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.buckets = {}
+        self.representatives = []
+        self.sizes = []
+    
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+    
+    def add(self, text):
+        """Cluster id for text (a new one if no cluster is similar enough)"""
+        signature = self.hasher.signature(text)
+        keys = list(self._band_keys(signature))
+        candidates = {c for key in keys for c in self.buckets.get(key, ())}
+        
+        best, best_similarity = None, self.threshold
+        for cluster in candidates:
+            similarity = float(np.mean(self.representatives[cluster] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = cluster, similarity
+        
+        if best is None:
+            best = len(self.representatives)
+            self.representatives.append(signature)
+            self.sizes.append(0)
+            for key in keys:
+                self.buckets.setdefault(key, []).append(best)
+        self.sizes[best] += 1
+        return best
+
+def cluster_ids(texts, threshold=JACCARD_THRESHOLD):
+    """Near-duplicate cluster id for each text"""
+    index = NearDuplicateIndex(threshold)
+    return [index.add(text) for text in texts]
+
+# ============================================
+# STREAMING I/O
+# ============================================
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    return {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}.get(ext, "csv")
+
+def iter_rows(path, batch_size=READ_BATCH_SIZE):
+    """Rows of a CSV, Parquet or Arrow IPC stream file as dicts, read in batches"""
+    fmt = _format(path)
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+        return
+    
+    import pyarrow as pa
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    else:
+        batches = pa.ipc.open_stream(pa.memory_map(path))
+    for batch in batches:
+        yield from batch.to_pylist()
+
+def arrow_schema(path):
+    """Schema of a Parquet/Arrow input, or None for CSV"""
+    fmt = _format(path)
+    if fmt == "csv":
+        return None
+    import pyarrow as pa
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path)
+    with pa.ipc.open_stream(pa.memory_map(path)) as reader:
+        return reader.schema
+
+class RowWriter:
+    """Batched CSV/Parquet/Arrow writer
+    
+    Columns come from the first row; Parquet/Arrow output uses `schema` when
+    given (e.g. the input's, to keep int8 labels and dictionary categories).
+    """
+    
+    def __init__(self, path, batch_size=READ_BATCH_SIZE, schema=None):
+        self.path = path
+        self.format = _format(path)
+        self.batch_size = batch_size
+        self.schema = schema
+        self.batch = []
+        self._file = self._writer = None
+    
+    def write(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        if not self.batch:
+            return
+        if self.format == "csv":
+            if self._writer is None:
+                self._file = open(self.path, "w", newline="", encoding="utf-8")
+                self._writer = csv.DictWriter(self._file, fieldnames=list(self.batch[0]))
+                self._writer.writeheader()
+            self._writer.writerows(self.batch)
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pylist(self.batch, schema=self.schema)
+            if self._writer is None:
+                if self.format == "parquet":
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+                else:
+                    self._writer = pa.ipc.new_stream(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        self.batch = []
+    
+    def close(self):
+        self.flush()
+        if self._writer is not None and self.format != "csv":
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+# ============================================
+# DEDUP
+# ============================================
+
+def dedup(input_path=DATASET_PATH, output_path=OUTPUT_PATH, max_per_cluster=MAX_PER_CLUSTER,
+          threshold=JACCARD_THRESHOLD, report_path=REPORT_PATH):
+    """Stream input_path, drop exact duplicates, cap clusters, write output_path
+    
+    Kept rows gain a `cluster` column. With output_path=None nothing is
+    written (report only). Returns the report dict.
+    """
+    index = NearDuplicateIndex(threshold)
+    seen = set()
+    kept_per_cluster = Counter()
+    labels_in, labels_out = Counter(), Counter()
+    cluster_label = {}
+    samples = {}
+    rows_in = rows_out = exact = 0
+    
+    start = time.perf_counter()
+    writer = None
+    if output_path:
+        schema = arrow_schema(input_path)
+        if schema is not None:
+            import pyarrow as pa
+            schema = schema.append(pa.field("cluster", pa.int32()))
+        writer = RowWriter(output_path, schema=schema)
+    try:
+        for row in iter_rows(input_path):
+            rows_in += 1
+            label = str(row.get("category", row.get("label")))
+            labels_in[label] += 1
+            
+            digest = hashlib.blake2b(row["text"].encode(), digest_size=16).digest()
+            if digest in seen:
+                exact += 1
+                continue
+            seen.add(digest)
+            
+            cluster = index.add(row["text"])
+            cluster_label.setdefault(cluster, label)
+            samples.setdefault(cluster, row["text"][:80])
+            if max_per_cluster and kept_per_cluster[cluster] >= max_per_cluster:
+                continue
+            kept_per_cluster[cluster] += 1
+            labels_out[label] += 1
+            rows_out += 1
+            if writer:
+                writer.write({**row, "cluster": cluster})
+            
+            if rows_in % 100_000 == 0:
+                print(f"  {rows_in:,} rows, {len(index.sizes):,} clusters, {rows_out:,} kept")
+    finally:
+        if writer:
+            writer.close()
+    seconds = time.perf_counter() - start
+    
+    sizes = np.array(index.sizes)
+    largest = np.argsort(-sizes)[:10]
+    report = {
+        "input": input_path,
+        "output": output_path,
+        "threshold": threshold,
+        "max_per_cluster": max_per_cluster,
+        "rows_in": rows_in,
+        "exact_duplicates": exact,
+        "clusters": len(sizes),
+        "rows_out": rows_out,
+        "compression_ratio": rows_in / rows_out if rows_out else None,
+        "rows_per_sec": rows_in / seconds if seconds else None,
+        "cluster_size": {
+            "median": float(np.median(sizes)) if len(sizes) else 0,
+            "max": int(sizes.max()) if len(sizes) else 0,
+            "singletons": int((sizes == 1).sum()),
+        },
+        "labels_in": dict(labels_in),
+        "labels_out": dict(labels_out),
+        "largest_clusters": [
+            {"cluster": int(c), "size": int(sizes[c]), "label": cluster_label[c], "sample": samples[c]}
+            for c in largest
+        ],
+    }
+    
+    print(f"\n{rows_in:,} rows in {seconds:.1f}s ({report['rows_per_sec']:,.0f} rows/sec)")
+    print(f"  exact duplicates:   {exact:,}")
+    print(f"  clusters:           {len(sizes):,} "
+          f"(median size {report['cluster_size']['median']:.0f}, max {report['cluster_size']['max']:,})")
+    print(f"  rows kept:          {rows_out:,} (max {max_per_cluster or 'unlimited'} per cluster)")
+    if rows_out:
+        print(f"  compression ratio:  {report['compression_ratio']:.1f}x")
+    print("  kept per label:     " + ", ".join(f"{k} {labels_out[k]:,}/{v:,}" for k, v in labels_in.items()))
+    
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {report_path}")
+    if output_path:
+        print(f"Deduplicated dataset saved to {output_path}")
+    return report
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate detection and dedup (MinHash/LSH)")
+    parser.add_argument("--input", default=DATASET_PATH, help="CSV, .parquet or .arrow dataset")
+    parser.add_argument("--output", default=OUTPUT_PATH,
+                        help="Deduplicated dataset (format from extension)")
+    parser.add_argument("--report-only", action="store_true", help="Don't write a dataset")
+    parser.add_argument("--max-per-cluster", type=int, default=MAX_PER_CLUSTER,
+                        help="Rows kept per near-duplicate cluster (0: no cap, exact dups only)")
+    parser.add_argument("--threshold", type=float, default=JACCARD_THRESHOLD,
+                        help="Estimated Jaccard similarity for near-duplicates")
+    parser.add_argument("--report", default=REPORT_PATH)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    print("=" * 50)
+    print("Near-Duplicate Dedup")
+    print("=" * 50)
+    
+    dedup(args.input, None if args.report_only else args.output,
+          args.max_per_cluster, args.threshold, args.report)
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,16 @@ Generates 1000+ labeled training examples across 4 categories:
 - not_job (3): Non-job emails (spam, newsletters, banking, e-commerce)
 """
 
+import argparse
 import csv
+import multiprocessing
+import os
 import random
-from datetime import datetime, timedelta
+import shutil
+import time
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from string import Formatter
 
 # ============================================
 # DATA SOURCES
@@ -648,23 +655,93 @@ Uber"""
 # GENERATOR FUNCTIONS
 # ============================================
 
-def generate_email(templates, label, name="Candidate"):
-    """Generate a single email from templates"""
-    template = random.choice(templates)
+CATEGORY_NAMES = ["applied", "interview", "rejection", "not_job"]
+COLUMNS = ["text", "label", "category", "template"]
+
+class CompiledTemplate:
+    """A str.format template pre-split into literal pieces and slots
     
-    company = random.choice(COMPANIES)
-    role = random.choice(JOB_TITLES)
-    recruiter = random.choice(RECRUITER_NAMES)
-    date = (datetime.now() - timedelta(days=random.randint(1, 30))).strftime("%B %d, %Y")
-    interview_date = (datetime.now() + timedelta(days=random.randint(2, 10))).strftime("%A, %B %d")
+    Parsing happens once; render() only fills the slot positions and joins.
+    """
     
-    subject = template["subject"].format(
-        company=company, role=role, name=name, recruiter=recruiter, date=date
+    __slots__ = ("pieces", "slots")
+    
+    def __init__(self, fmt):
+        pieces = []
+        slots = []
+        for literal, field, spec, conversion in Formatter().parse(fmt):
+            if literal:
+                pieces.append(literal)
+            if field is not None:
+                if spec or conversion:
+                    raise ValueError(f"Unsupported format spec in template field {{{field}}}")
+                slots.append((len(pieces), field))
+                pieces.append(None)
+        self.pieces = tuple(pieces)
+        self.slots = tuple(slots)
+    
+    def render(self, fields):
+        pieces = list(self.pieces)
+        for idx, field in self.slots:
+            pieces[idx] = fields[field]
+        return "".join(pieces)
+
+def compile_templates(templates):
+    """Compile a template list into (subject, body) CompiledTemplate pairs"""
+    return [
+        (CompiledTemplate(t["subject"]), CompiledTemplate(t["body"]))
+        for t in templates
+    ]
+
+_COMPILED_TEMPLATES = {}
+
+def get_compiled(templates):
+    """Compiled form of a template list, compiled on first use"""
+    compiled = _COMPILED_TEMPLATES.get(id(templates))
+    if compiled is None:
+        compiled = _COMPILED_TEMPLATES[id(templates)] = compile_templates(templates)
+    return compiled
+
+@lru_cache(maxsize=8)
+def date_pools(day):
+    """Precomputed date strings relative to a given day
+    
+    Returns (past, upcoming): "{date}" values for 1-30 days before and
+    "{interview_date}" values for 2-10 days after.
+    """
+    base = datetime(day.year, day.month, day.day)
+    past = tuple(
+        (base - timedelta(days=d)).strftime("%B %d, %Y") for d in range(1, 31)
     )
-    body = template["body"].format(
-        company=company, role=role, name=name, recruiter=recruiter, 
-        date=date, interview_date=interview_date
+    upcoming = tuple(
+        (base + timedelta(days=d)).strftime("%A, %B %d") for d in range(2, 11)
     )
+    return past, upcoming
+
+def generate_email(templates, label, name="Candidate", rng=random, base_date=None):
+    """Generate a single email from templates
+    
+    rng may be a seeded random.Random; base_date pins the date placeholders
+    (defaults to today) so that seeded runs are reproducible. The returned
+    "template" id (e.g. "interview/3") lets training split by template.
+    """
+    compiled = get_compiled(templates)
+    # Same draw as rng.choice(compiled), so seeded output is unchanged
+    index = rng.randrange(len(compiled))
+    subject_tpl, body_tpl = compiled[index]
+    past, upcoming = date_pools(base_date.date() if base_date else date.today())
+    
+    fields = {
+        "company": rng.choice(COMPANIES),
+        "role": rng.choice(JOB_TITLES),
+        "name": name,
+        "recruiter": rng.choice(RECRUITER_NAMES),
+        "date": rng.choice(past),
+        "interview_date": rng.choice(upcoming),
+    }
+    
+    subject = subject_tpl.render(fields)
+    body = body_tpl.render(fields)
     
     # Combine subject and body for training
     text = f"Subject: {subject}\n\n{body}"
@@ -674,10 +751,11 @@ def generate_email(templates, label, name="Candidate"):
         "subject": subject,
         "body": body,
         "label": label,
-        "category": ["applied", "interview", "rejection", "not_job"][label]
+        "category": CATEGORY_NAMES[label],
+        "template": f"{CATEGORY_NAMES[label]}/{index}",
     }
 
-def add_noise(text):
+def add_noise(text, rng=random):
     """Add slight variations to make data more realistic"""
     variations = [
         lambda t: t,  # No change
@@ -687,37 +765,21 @@ def add_noise(text):
         lambda t: t.replace("Thank you", "Thanks"),
         lambda t: t.replace("Best regards", "Best"),
         lambda t: t.replace("Sincerely", "Regards"),
-        lambda t: t.lower() if random.random() < 0.1 else t,  # Rare lowercase
+        lambda t: t.lower() if rng.random() < 0.1 else t,  # Rare lowercase
     ]
-    return random.choice(variations)(text)
+    return rng.choice(variations)(text)
+
+CATEGORY_TEMPLATES = [
+    (APPLIED_TEMPLATES, 0),
+    (INTERVIEW_TEMPLATES, 1),
+    (REJECTION_TEMPLATES, 2),
+    (NOT_JOB_TEMPLATES, 3),
+]
 
 def generate_dataset(num_per_category=300):
-    """Generate complete dataset"""
-    dataset = []
-    
-    # Generate each category
+    """Generate complete dataset (iter_emails, collected and shuffled in memory)"""
     print(f"Generating {num_per_category} emails per category...")
-    
-    for i in range(num_per_category):
-        # Applied (label 0)
-        email = generate_email(APPLIED_TEMPLATES, 0)
-        email["text"] = add_noise(email["text"])
-        dataset.append(email)
-        
-        # Interview (label 1)
-        email = generate_email(INTERVIEW_TEMPLATES, 1)
-        email["text"] = add_noise(email["text"])
-        dataset.append(email)
-        
-        # Rejection (label 2)
-        email = generate_email(REJECTION_TEMPLATES, 2)
-        email["text"] = add_noise(email["text"])
-        dataset.append(email)
-        
-        # Not Job (label 3)
-        email = generate_email(NOT_JOB_TEMPLATES, 3)
-        email["text"] = add_noise(email["text"])
-        dataset.append(email)
+    dataset = list(iter_emails(num_per_category))
     
     # Shuffle dataset
     random.shuffle(dataset)
@@ -727,43 +789,395 @@ def generate_dataset(num_per_category=300):
 def save_to_csv(dataset, filename="job_emails_dataset.csv"):
     """Save dataset to CSV"""
     with open(filename, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=["text", "label", "category"])
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
         writer.writeheader()
         for item in dataset:
             writer.writerow({
                 "text": item["text"],
                 "label": item["label"],
-                "category": item["category"]
+                "category": item["category"],
+                "template": item["template"],
             })
     print(f"Saved {len(dataset)} emails to {filename}")
 
-def main():
-    print("=" * 50)
-    print("Synthetic Email Dataset Generator")
-    print("=" * 50)
+# ============================================
+# STREAMING GENERATION
+# ============================================
+
+SHUFFLE_BUFFER_SIZE = 100_000  # Rows held in memory while shuffling
+WRITE_BATCH_SIZE = 10_000  # Rows per bulk write
+
+def iter_emails(num_per_category=300, rng=random, base_date=None):
+    """Yield emails one at a time, interleaving the categories"""
+    for i in range(num_per_category):
+        for templates, label in CATEGORY_TEMPLATES:
+            email = generate_email(templates, label, rng=rng, base_date=base_date)
+            email["text"] = add_noise(email["text"], rng)
+            yield email
+
+def shuffle_buffer(rows, buffer_size=SHUFFLE_BUFFER_SIZE, rng=random):
+    """Shuffle a stream using a fixed-size buffer (bounded memory)
+    
+    Each incoming row replaces a random slot of the full buffer and the
+    evicted row is emitted, so memory stays at buffer_size rows no matter
+    how long the stream is. buffer_size 0 passes the stream through unshuffled.
+    """
+    if buffer_size <= 0:
+        yield from rows
+        return
+    buffer = []
+    for row in rows:
+        if len(buffer) < buffer_size:
+            buffer.append(row)
+            continue
+        idx = rng.randrange(buffer_size)
+        yield buffer[idx]
+        buffer[idx] = row
+    
+    rng.shuffle(buffer)
+    yield from buffer
+
+def iter_batches(rows, batch_size=WRITE_BATCH_SIZE):
+    """Group a stream of rows into lists of at most batch_size"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class DatasetStats:
+    """Label counts and one sample per category, kept as rows stream by"""
+    
+    def __init__(self):
+        self.total = 0
+        self.counts = [0] * len(CATEGORY_NAMES)
+        self.samples = {}
+    
+    def update(self, batch):
+        for row in batch:
+            label = row["label"]
+            self.counts[label] += 1
+            if label not in self.samples:
+                self.samples[label] = row
+        self.total += len(batch)
+    
+    def merge(self, other):
+        for label, count in enumerate(other.counts):
+            self.counts[label] += count
+        for label, row in other.samples.items():
+            self.samples.setdefault(label, row)
+        self.total += other.total
+
+def stream_to_csv(rows, filename="job_emails_dataset.csv", batch_size=WRITE_BATCH_SIZE,
+                  verbose=True):
+    """Write a stream of rows to CSV in bulk batches, returning DatasetStats"""
+    stats = DatasetStats()
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for batch in iter_batches(rows, batch_size):
+            writer.writerows(
+                (item["text"], item["label"], item["category"], item["template"])
+                for item in batch
+            )
+            stats.update(batch)
+    if verbose:
+        print(f"Saved {stats.total} emails to {filename}")
+    return stats
+
+# ============================================
+# COLUMNAR OUTPUT (PARQUET / ARROW IPC)
+# ============================================
+
+def output_format(filename):
+    """Output format implied by the file extension: csv, parquet or arrow"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".parquet":
+        return "parquet"
+    if ext in (".arrow", ".feather"):
+        return "arrow"
+    return "csv"
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError(
+            "Parquet/Arrow output requires pyarrow: pip install pyarrow"
+        ) from e
+    return pa
+
+def arrow_schema(pa):
+    """text as utf8, label as int8, category dictionary-encoded over CATEGORY_NAMES,
+    template as utf8"""
+    return pa.schema([
+        ("text", pa.string()),
+        ("label", pa.int8()),
+        ("category", pa.dictionary(pa.int8(), pa.string())),
+        ("template", pa.string()),
+    ])
+
+def to_record_batch(pa, batch, schema):
+    """Convert a list of row dicts into an Arrow record batch"""
+    labels = pa.array([item["label"] for item in batch], type=pa.int8())
+    # Labels index CATEGORY_NAMES directly, so they double as dictionary indices
+    category = pa.DictionaryArray.from_arrays(labels, pa.array(CATEGORY_NAMES))
+    text = pa.array([item["text"] for item in batch], type=pa.string())
+    template = pa.array([item["template"] for item in batch], type=pa.string())
+    return pa.RecordBatch.from_arrays([text, labels, category, template], schema=schema)
+
+def open_arrow_writer(pa, filename, schema):
+    """Parquet or Arrow IPC writer, chosen by extension
+    
+    .arrow files use the IPC stream format, which is what `datasets` itself
+    uses for its cache and can memory-map directly via Dataset.from_file.
+    """
+    if output_format(filename) == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(filename, schema, compression="zstd")
+    return pa.ipc.new_stream(filename, schema)
+
+def stream_to_arrow(rows, filename, batch_size=WRITE_BATCH_SIZE, verbose=True):
+    """Write a stream of rows to Parquet/Arrow IPC in record batches, returning DatasetStats"""
+    pa = _import_pyarrow()
+    schema = arrow_schema(pa)
+    stats = DatasetStats()
+    with open_arrow_writer(pa, filename, schema) as writer:
+        for batch in iter_batches(rows, batch_size):
+            writer.write_batch(to_record_batch(pa, batch, schema))
+            stats.update(batch)
+    if verbose:
+        print(f"Saved {stats.total} emails to {filename}")
+    return stats
+
+def write_stream(rows, filename, batch_size=WRITE_BATCH_SIZE, verbose=True):
+    """Write a stream of rows in the format implied by filename"""
+    if output_format(filename) == "csv":
+        return stream_to_csv(rows, filename, batch_size, verbose)
+    return stream_to_arrow(rows, filename, batch_size, verbose)
+
+def generate_dataset_streaming(num_per_category=300, filename="job_emails_dataset.csv",
+                               buffer_size=SHUFFLE_BUFFER_SIZE, batch_size=WRITE_BATCH_SIZE):
+    """Generate, shuffle and write the dataset without holding it in memory"""
+    print(f"Streaming {num_per_category} emails per category "
+          f"(shuffle buffer: {buffer_size}, batch: {batch_size})...")
+    rows = shuffle_buffer(iter_emails(num_per_category), buffer_size)
+    return write_stream(rows, filename, batch_size)
+
+# ============================================
+# SHARDED GENERATION
+# ============================================
+
+# Fixed reference date for sharded runs, so output does not depend on the
+# day the generator is run
+SHARD_BASE_DATE = datetime(2024, 6, 1)
+
+def shard_sizes(num_per_category, num_shards):
+    """Split num_per_category as evenly as possible across shards"""
+    base, extra = divmod(num_per_category, num_shards)
+    return [base + (1 if i < extra else 0) for i in range(num_shards)]
+
+def shard_path(filename, shard, num_shards):
+    """Output path of a single shard, e.g. data.shard003-of-032.csv"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.shard{shard:03d}-of-{num_shards:03d}{ext}"
+
+def generate_shard(task):
+    """Generate one shard with its own seeded RNG (runs in a worker process)"""
+    shard, num_shards, count, seed, filename, buffer_size, batch_size, base_date = task
+    rng = random.Random(f"{seed}:{shard}:{num_shards}")
+    rows = shuffle_buffer(iter_emails(count, rng, base_date), buffer_size, rng)
+    path = shard_path(filename, shard, num_shards)
+    return path, write_stream(rows, path, batch_size, verbose=False)
+
+def merge_shards(paths, filename):
+    """Concatenate shards in shard order into a single file"""
+    if output_format(filename) != "csv":
+        merge_arrow_shards(paths, filename)
+        return
     
-    # Generate dataset
-    dataset = generate_dataset(num_per_category=300)
+    with open(filename, 'wb') as out:
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out)
+    print(f"Merged {len(paths)} shards into {filename}")
+
+def merge_arrow_shards(paths, filename):
+    """Concatenate Parquet/Arrow shards batch by batch into a single file"""
+    pa = _import_pyarrow()
+    schema = arrow_schema(pa)
+    with open_arrow_writer(pa, filename, schema) as writer:
+        for path in paths:
+            if output_format(path) == "parquet":
+                import pyarrow.parquet as pq
+                batches = pq.ParquetFile(path).iter_batches()
+            else:
+                batches = pa.ipc.open_stream(pa.memory_map(path))
+            for batch in batches:
+                writer.write_batch(batch.cast(schema))
+    print(f"Merged {len(paths)} shards into {filename}")
+
+def generate_dataset_sharded(num_per_category=300, filename="job_emails_dataset.csv",
+                             workers=1, shards=None, seed=42, merge=False,
+                             buffer_size=SHUFFLE_BUFFER_SIZE, batch_size=WRITE_BATCH_SIZE,
+                             base_date=SHARD_BASE_DATE):
+    """Generate the dataset as independent shards across a process pool
     
-    # Print statistics
-    print(f"\nTotal emails generated: {len(dataset)}")
-    for label in range(4):
-        count = sum(1 for d in dataset if d["label"] == label)
-        category = ["applied", "interview", "rejection", "not_job"][label]
-        print(f"  {category}: {count}")
+    Output depends only on (seed, shards, num_per_category, base_date), never
+    on the number of workers, so runs are byte-identical and diffable.
+    """
+    shards = shards or workers
+    tasks = [
+        (i, shards, count, seed, filename, buffer_size, batch_size, base_date)
+        for i, count in enumerate(shard_sizes(num_per_category, shards))
+    ]
+    print(f"Generating {num_per_category} emails per category in {shards} shards "
+          f"on {workers} workers (seed {seed})...")
     
-    # Save to CSV
-    save_to_csv(dataset)
+    stats = DatasetStats()
+    paths = []
+    with multiprocessing.Pool(workers) as pool:
+        for path, shard_stats in pool.imap(generate_shard, tasks):
+            print(f"Saved {shard_stats.total} emails to {path}")
+            paths.append(path)
+            stats.merge(shard_stats)
+    
+    if merge:
+        merge_shards(paths, filename)
+        for path in paths:
+            os.remove(path)
+    return stats
+
+# ============================================
+# TEMPLATE BENCHMARK
+# ============================================
+
+def _format_row(template, rng, name="Candidate"):
+    """Reference row using per-row str.format and datetime.now() (pre-compile path)"""
+    company = rng.choice(COMPANIES)
+    role = rng.choice(JOB_TITLES)
+    recruiter = rng.choice(RECRUITER_NAMES)
+    date_str = (datetime.now() - timedelta(days=rng.randint(1, 30))).strftime("%B %d, %Y")
+    interview_date = (datetime.now() + timedelta(days=rng.randint(2, 10))).strftime("%A, %B %d")
+    subject = template["subject"].format(
+        company=company, role=role, name=name, recruiter=recruiter, date=date_str
+    )
+    body = template["body"].format(
+        company=company, role=role, name=name, recruiter=recruiter,
+        date=date_str, interview_date=interview_date
+    )
+    return f"Subject: {subject}\n\n{body}"
+
+def benchmark_templates(num_rows=100_000, seed=0):
+    """Report rows/sec of str.format rendering vs compiled templates"""
+    all_templates = [t for templates, _ in CATEGORY_TEMPLATES for t in templates]
+    
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for i in range(num_rows):
+        _format_row(all_templates[i % len(all_templates)], rng)
+    format_rate = num_rows / (time.perf_counter() - start)
+    
+    rng = random.Random(seed)
+    # Compile every category and build the date pools outside the timed loop
+    for templates, _ in CATEGORY_TEMPLATES:
+        get_compiled(templates)
+    date_pools(date.today())
+    start = time.perf_counter()
+    for i in range(num_rows):
+        templates, label = CATEGORY_TEMPLATES[i % len(CATEGORY_TEMPLATES)]
+        generate_email(templates, label, rng=rng)
+    compiled_rate = num_rows / (time.perf_counter() - start)
+    
+    print(f"str.format:         {format_rate:,.0f} rows/sec")
+    print(f"compiled templates: {compiled_rate:,.0f} rows/sec")
+    print(f"speedup:            {compiled_rate / format_rate:.2f}x")
+    return {"format_rows_per_sec": format_rate, "compiled_rows_per_sec": compiled_rate}
+
+# ============================================
+# MAIN
+# ============================================
+
+def print_summary(stats):
+    """Print label counts and one preview per category"""
+    print(f"\nTotal emails generated: {stats.total}")
+    for label, category in enumerate(CATEGORY_NAMES):
+        print(f"  {category}: {stats.counts[label]}")
     
-    # Preview samples
     print("\n" + "=" * 50)
     print("Sample emails:")
     print("=" * 50)
-    for label in range(4):
-        sample = next(d for d in dataset if d["label"] == label)
+    for label in range(len(CATEGORY_NAMES)):
+        sample = stats.samples.get(label)
+        if sample is None:
+            continue
         print(f"\n[{sample['category'].upper()}]")
         print(f"Text preview: {sample['text'][:200]}...")
         print("-" * 30)
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic email dataset generator")
+    parser.add_argument("--num-per-category", type=int, default=300,
+                        help="Emails to generate for each category")
+    parser.add_argument("--output", default="job_emails_dataset.csv",
+                        help="Output file (.csv, .parquet or .arrow)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Generate and write in a bounded-memory pipeline")
+    parser.add_argument("--buffer-size", type=int, default=SHUFFLE_BUFFER_SIZE,
+                        help="Shuffle buffer size in rows, 0 to not shuffle (--stream only)")
+    parser.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE,
+                        help="Rows per bulk write (--stream only)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Generate shards in a pool of N processes (implies --stream)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="Number of output shards (defaults to --workers)")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Base seed for per-shard RNGs (--workers only)")
+    parser.add_argument("--merge", action="store_true",
+                        help="Merge shards into --output and delete them (--workers only)")
+    parser.add_argument("--bench-templates", type=int, metavar="ROWS", default=0,
+                        help="Benchmark template rendering over ROWS rows and exit")
+    args = parser.parse_args(argv)
+    if args.buffer_size < 0:
+        parser.error("--buffer-size must be 0 (no shuffle) or more")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    if args.bench_templates:
+        benchmark_templates(args.bench_templates)
+        return
+    
+    print("=" * 50)
+    print("Synthetic Email Dataset Generator")
+    print("=" * 50)
+    
+    if args.workers:
+        stats = generate_dataset_sharded(
+            args.num_per_category, args.output, args.workers, args.shards,
+            args.seed, args.merge, args.buffer_size, args.batch_size
+        )
+    elif args.stream:
+        stats = generate_dataset_streaming(
+            args.num_per_category, args.output, args.buffer_size, args.batch_size
+        )
+    else:
+        dataset = generate_dataset(num_per_category=args.num_per_category)
+        if output_format(args.output) == "csv":
+            save_to_csv(dataset, args.output)
+        else:
+            write_stream(dataset, args.output)
+        stats = DatasetStats()
+        stats.update(dataset)
+    
+    print_summary(stats)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,211 @@
+"""
+Run Instrumentation for the ML Pipeline
+Per-stage wall-clock and peak-RSS timers, throughput counters and an optional
+cProfile dump, collected into a structured JSON run report.
+
+Usage:
+    with RunReport("train", profile_path="train.prof") as report:
+        with stage("load_data"):
+            ...
+        count("train", samples=n, tokens=t)
+    report.save("./run_report.json")
+
+stage() and count() are no-ops when no report is active, so library code can
+call them unconditionally.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active = None
+
+# ============================================
+# MEMORY
+# ============================================
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (MB), or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def current_rss_mb():
+    """Current resident set size (MB), or None where it can't be read cheaply"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+# ============================================
+# RUN REPORT
+# ============================================
+
+class RunReport:
+    """Stage timings, memory and throughput for one pipeline run
+    
+    Stages nest: a stage opened inside another is recorded as
+    "outer/inner". Peak RSS is the process high-water mark at the end of the
+    stage, so a stage's peak_rss_mb is at least that of any earlier stage;
+    rss_delta_mb shows what the stage itself kept allocated.
+    """
+    
+    def __init__(self, name, profile_path=None):
+        self.name = name
+        self.profile_path = profile_path
+        self.stages = []
+        self.counters = {}
+        self.extra = {}
+        self._stack = []
+        self._profiler = None
+        self._start = None
+        self.total_seconds = None
+    
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        _active = self
+        self._start = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        if self.profile_path:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+    
+    def __exit__(self, *exc):
+        global _active
+        if self._profiler:
+            self._profiler.disable()
+            # pstats format: snakeviz, `python -m pstats`, or flameprof/gprof2dot
+            self._profiler.dump_stats(self.profile_path)
+            print(f"Saved cProfile stats to {self.profile_path}")
+        self.total_seconds = time.perf_counter() - self._start
+        _active = self._previous
+        return False
+    
+    @contextmanager
+    def stage(self, name):
+        path = "/".join(self._stack + [name])
+        self._stack.append(name)
+        # Appended on entry so stages are listed in start order (parents first)
+        record = {"stage": path}
+        self.stages.append(record)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            rss_after = current_rss_mb()
+            record.update({
+                "seconds": _round(seconds),
+                "peak_rss_mb": _round(peak_rss_mb(), 1),
+                "rss_mb": _round(rss_after, 1),
+                "rss_delta_mb": _round(
+                    rss_after - rss_before if rss_after is not None and rss_before is not None else None, 1
+                ),
+            })
+            print(f"  [{path}] {seconds:.2f}s, peak RSS {peak_rss_mb() or 0:.0f} MB")
+    
+    def count(self, stage, samples=0, tokens=0, seconds=None):
+        """Add samples/tokens processed by a stage
+        
+        Throughput is computed against `seconds` if given (e.g. the Trainer's
+        own train_runtime), otherwise against the stage's recorded wall time.
+        """
+        counter = self.counters.setdefault(stage, {"samples": 0, "tokens": 0, "seconds": None})
+        counter["samples"] += samples
+        counter["tokens"] += tokens
+        if seconds is not None:
+            counter["seconds"] = (counter["seconds"] or 0) + seconds
+    
+    def throughput(self):
+        results = {}
+        for stage, counter in self.counters.items():
+            seconds = counter["seconds"]
+            if seconds is None:
+                seconds = sum(s["seconds"] for s in self.stages if s["stage"].split("/")[-1] == stage)
+            results[stage] = {
+                "samples": counter["samples"],
+                "tokens": counter["tokens"],
+                "seconds": _round(seconds),
+                "samples_per_sec": _round(counter["samples"] / seconds, 2) if seconds else None,
+                "tokens_per_sec": _round(counter["tokens"] / seconds, 1) if seconds else None,
+            }
+        return results
+    
+    def to_dict(self):
+        return {
+            "run": self.name,
+            "started_at": self.started_at,
+            "total_seconds": _round(self.total_seconds),
+            "peak_rss_mb": _round(peak_rss_mb(), 1),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "stages": self.stages,
+            "throughput": self.throughput(),
+            "profile": self.profile_path,
+            **self.extra,
+        }
+    
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Saved run report to {path}")
+    
+    def print_summary(self):
+        total = self.total_seconds or sum(s["seconds"] for s in self.stages if "/" not in s["stage"])
+        print("\nStage timings:")
+        for s in self.stages:
+            share = s["seconds"] / total if total else 0
+            print(f"  {s['stage']:<28} {s['seconds']:>9.2f}s {share:>6.1%}  "
+                  f"peak RSS {s['peak_rss_mb'] or 0:>7.0f} MB")
+        for stage, t in self.throughput().items():
+            print(f"  {stage}: {t['samples_per_sec'] or 0:,.1f} samples/sec, "
+                  f"{t['tokens_per_sec'] or 0:,.0f} tokens/sec")
+
+# ============================================
+# MODULE-LEVEL HOOKS
+# ============================================
+
+def active_report():
+    return _active
+
+@contextmanager
+def stage(name):
+    """Time a stage on the active report (no-op without one)"""
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+def count(stage, samples=0, tokens=0, seconds=None):
+    """Add throughput counts to the active report (no-op without one)"""
+    if _active is not None:
+        _active.count(stage, samples, tokens, seconds)
@@ -0,0 +1,182 @@
+"""
+Learned Keyword Weights for the Rule-Based Email Classifier
+Fits a sparse linear model (n-gram TF-IDF + logistic regression) on the
+generated corpus and exports the top phrases per category as a compact JSON
+table that src/lib/emailClassifier.js can load in place of CATEGORY_KEYWORDS.
+"""
+
+import json
+import re
+import sys
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score
+
+from train_classifier import DATASET_PATH, LABEL_NAMES, load_data
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+NGRAM_RANGE = (1, 3)
+MIN_DF = 5  # Ignore phrases seen in fewer documents
+MAX_FEATURES = 50_000
+REGULARIZATION_C = 1.0
+MAX_ITER = 10_000  # saga needs ~6k passes on the unnormalized features to converge
+TOP_K = 40  # Phrases kept per category (largest |weight|)
+# Letters-only words: numbers (dates, order ids) are template noise, not signal
+TOKEN_PATTERN = r"(?u)\b[^\W\d_]+\b"
+# Same for the words around them: phrases containing these are dropped
+TEMPLATE_WORDS = frozenset([
+    # dates
+    'january', 'february', 'march', 'april', 'june', 'july', 'august',
+    'september', 'october', 'november', 'december',  # not 'may': "you may"
+    'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+    # header lines and salutations
+    'subject', 'date', 'dear', 'hello', 'hi', 'candidate',
+])
+OUTPUT_PATH = "./keyword_weights.json"
+
+# ============================================
+# MODEL
+# ============================================
+
+def build_vectorizer(vocabulary=None):
+    """Binary-TF, IDF-weighted, unnormalized n-grams
+    
+    With binary TF and no length normalization, a phrase contributes
+    coef * idf whenever it is present. Folding idf into the exported weight
+    makes the JS scorer (sum of weights of phrases the text contains) compute
+    exactly the model's logits.
+    """
+    return TfidfVectorizer(
+        vocabulary=vocabulary,
+        token_pattern=TOKEN_PATTERN,
+        ngram_range=NGRAM_RANGE,
+        min_df=MIN_DF,
+        max_features=MAX_FEATURES,
+        lowercase=True,
+        binary=True,
+        norm=None,
+        sublinear_tf=False,
+    )
+
+def fit_vectorizer(texts):
+    """Fit the vectorizer, then refit it on the phrases free of TEMPLATE_WORDS
+    
+    Phrases are dropped after tokenizing rather than passed as stop_words,
+    which would join the words on either side into n-grams that never occur
+    in the text (and that the JS scorer could never match).
+    """
+    phrases = build_vectorizer().fit(texts).get_feature_names_out()
+    vocabulary = [p for p in phrases if TEMPLATE_WORDS.isdisjoint(p.split())]
+    vectorizer = build_vectorizer(vocabulary)
+    return vectorizer, vectorizer.fit_transform(texts)
+
+def fit_model(texts, labels):
+    """Fit the vectorizer and an L1-regularized multinomial logistic regression"""
+    vectorizer, features = fit_vectorizer(texts)
+    model = LogisticRegression(
+        penalty='l1',
+        C=REGULARIZATION_C,
+        solver='saga',
+        max_iter=MAX_ITER,
+    )
+    model.fit(features, labels)
+    return vectorizer, model
+
+def prune_weights(vectorizer, model, top_k=TOP_K):
+    """Keep the top_k phrases per category by absolute effective weight"""
+    phrases = vectorizer.get_feature_names_out()
+    effective = model.coef_ * vectorizer.idf_  # fold idf into each weight
+    
+    keywords = {}
+    for label, name in enumerate(LABEL_NAMES):
+        row = effective[label]
+        nonzero = np.flatnonzero(row)
+        top = nonzero[np.argsort(-np.abs(row[nonzero]))[:top_k]]
+        keywords[name] = {
+            str(phrases[i]): round(float(row[i]), 3)
+            for i in sorted(top, key=lambda i: -row[i])
+        }
+    
+    intercepts = {name: round(float(b), 3) for name, b in zip(LABEL_NAMES, model.intercept_)}
+    return {
+        'version': 1,
+        'categories': LABEL_NAMES,
+        'intercepts': intercepts,
+        'keywords': keywords,
+    }
+
+# ============================================
+# REFERENCE SCORER (mirrors emailClassifier.js)
+# ============================================
+
+def normalize_text(text):
+    """Lowercased words joined by single spaces, padded with a space each side
+    
+    Phrases are matched as ' phrase ' against this, so they only hit whole
+    words, exactly like the vectorizer's n-grams.
+    """
+    return " " + " ".join(re.findall(r"[^\W\d_]+", text.lower())) + " "
+
+def score_text(text, table):
+    """Per-category score: intercept + weights of phrases contained in the text"""
+    normalized = normalize_text(text)
+    return [
+        table['intercepts'][name] + sum(
+            weight for phrase, weight in table['keywords'][name].items()
+            if f" {phrase} " in normalized
+        )
+        for name in table['categories']
+    ]
+
+def classify_text(text, table):
+    scores = score_text(text, table)
+    return max(range(len(scores)), key=scores.__getitem__)
+
+def evaluate(labels, preds):
+    return {
+        'accuracy': accuracy_score(labels, preds),
+        'f1': f1_score(labels, preds, average='weighted'),
+    }
+
+# ============================================
+# MAIN
+# ============================================
+
+def main(dataset_path=None, output_path=OUTPUT_PATH, top_k=TOP_K):
+    print("=" * 50)
+    print("Learned Keyword Weights")
+    print("=" * 50)
+    
+    dataset = load_data(dataset_path or DATASET_PATH)
+    train, test = dataset['train'], dataset['test']
+    
+    print(f"\nFitting TF-IDF {NGRAM_RANGE} + logistic regression...")
+    vectorizer, model = fit_model(train['text'], train['label'])
+    print(f"Vocabulary: {len(vectorizer.vocabulary_):,} phrases, "
+          f"{np.count_nonzero(model.coef_):,} non-zero weights")
+    
+    table = prune_weights(vectorizer, model, top_k)
+    
+    full = evaluate(test['label'], model.predict(vectorizer.transform(test['text'])))
+    pruned = evaluate(test['label'], [classify_text(t, table) for t in test['text']])
+    table['metrics'] = {'full_model': full, f'top_{top_k}': pruned, 'test_size': len(test)}
+    
+    print(f"\nTest accuracy (full model):   {full['accuracy']:.4f}  F1: {full['f1']:.4f}")
+    print(f"Test accuracy (top {top_k} table): {pruned['accuracy']:.4f}  F1: {pruned['f1']:.4f}")
+    
+    for name in LABEL_NAMES:
+        top = list(table['keywords'][name].items())[:5]
+        print(f"  {name}: " + ", ".join(f"'{p}' {w:+.2f}" for p, w in top))
+    
+    with open(output_path, 'w') as f:
+        json.dump(table, f, separators=(',', ':'))
+    print(f"\nSaved weight table to {output_path}")
+    return table
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,391 @@
+"""
+ONNX Runtime Session Factory for CPU Serving
+One place that builds InferenceSessions for the exported classifier: the
+execution provider, intra/inter-op threads, graph optimization level, memory
+arena settings and (optionally) static sequence lengths.
+
+Usage:
+    session = load_session("./job_classifier.onnx")
+    probabilities = session.classify(tokenizer, texts)
+    python onnx_session.py [--objective latency] [--samples 512]   # autotune
+    python onnx_session.py --show                                   # resolved config
+    python train_classifier.py tune-onnx [onnx_session.py options]
+
+Graph optimization (attention/GELU/LayerNorm fusion) runs every time a
+session is created unless the optimized model is saved: with SAVE_OPTIMIZED,
+the first load writes job_classifier.opt.onnx next to the model and later
+loads start from the fused graph. Autotune sweeps the settings on the test split
+and records the fastest config per host and model in TUNED_CONFIG_PATH;
+load_session picks it up automatically.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import train_classifier as tc
+from prediction_cache import model_version
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+EXECUTION_PROVIDERS = ("CPUExecutionProvider",)  # Preference order; unavailable ones are skipped
+INTRA_OP_THREADS = None  # Threads per operator (None: physical cores available to this process)
+INTER_OP_THREADS = 1  # >1 runs independent graph branches in parallel
+GRAPH_OPTIMIZATION = "all"  # disable | basic | extended | all
+CPU_MEM_ARENA = True  # Keep freed buffers for reuse instead of returning them to malloc
+MEM_PATTERN = True  # Pre-plan allocations per input shape
+ALLOW_SPINNING = True  # Idle worker threads busy-wait: lower latency, more CPU
+SEQUENCE_BUCKETS = None  # e.g. (64, 128, 256): pad to these lengths so shapes repeat (None: longest)
+SAVE_OPTIMIZED = True  # Reuse job_classifier.opt.onnx instead of re-optimizing at startup
+
+TUNED_CONFIG_PATH = "./onnx_session.json"  # Fastest config per host and model content hash
+AUTOTUNE_SAMPLES = 256  # Test-split emails per timed run
+AUTOTUNE_REPEATS = 3  # Timed runs per config; the median is reported
+AUTOTUNE_BATCH_SIZE = tc.PREDICT_BATCH_SIZE
+AUTOTUNE_LATENCY_SAMPLES = 50  # Single-email runs for the latency objective
+AUTOTUNE_MIN_GAIN = 0.02  # A setting must beat the current best by this much to replace it
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+# ============================================
+# SESSION CONFIG
+# ============================================
+
+def host_key():
+    """CPU model, usable cores and onnxruntime version: what a tuned config depends on"""
+    ort = tc._import_onnxruntime()
+    cpu = platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return f"{cpu} | {tc.available_cores()} cores | onnxruntime {ort.__version__}"
+
+def select_providers(preferred=EXECUTION_PROVIDERS):
+    """Available providers from `preferred`, with CPU always last as the fallback"""
+    ort = tc._import_onnxruntime()
+    available = ort.get_available_providers()
+    providers = [p for p in preferred if p in available and p != "CPUExecutionProvider"]
+    return providers + ["CPUExecutionProvider"]
+
+def default_config():
+    """Session settings from the constants above, resolved for this machine"""
+    return {
+        'providers': select_providers(),
+        'intra_op_threads': INTRA_OP_THREADS or tc.available_cores(),
+        'inter_op_threads': INTER_OP_THREADS,
+        'graph_optimization': GRAPH_OPTIMIZATION,
+        'cpu_mem_arena': CPU_MEM_ARENA,
+        'mem_pattern': MEM_PATTERN,
+        'allow_spinning': ALLOW_SPINNING,
+        'sequence_buckets': SEQUENCE_BUCKETS,
+        'save_optimized': SAVE_OPTIMIZED,
+    }
+
+def tuned_config(onnx_path, path=TUNED_CONFIG_PATH):
+    """Settings autotune recorded for this host and model, or None
+    
+    Entries are keyed by the model's content hash, so a re-exported model
+    (or a student saved under the same name) isn't run with stale settings.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        entry = json.load(f).get(host_key(), {}).get(model_version(onnx_path))
+    if not entry:
+        return None
+    config = dict(entry['config'])
+    if config.get('sequence_buckets'):
+        config['sequence_buckets'] = tuple(config['sequence_buckets'])
+    return config
+
+def session_config(onnx_path, use_tuned=True, tuned_path=TUNED_CONFIG_PATH, **overrides):
+    """Defaults, then this host's tuned settings, then explicit overrides"""
+    config = default_config()
+    if use_tuned:
+        config.update(tuned_config(onnx_path, tuned_path) or {})
+    config.update(overrides)
+    return config
+
+def session_options(config):
+    ort = tc._import_onnxruntime()
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = config['intra_op_threads']
+    options.inter_op_num_threads = config['inter_op_threads']
+    # Inter-op threads are only used by the parallel executor
+    options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if config['inter_op_threads'] > 1
+                              else ort.ExecutionMode.ORT_SEQUENTIAL)
+    options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[config['graph_optimization']]
+    )
+    options.enable_cpu_mem_arena = config['cpu_mem_arena']
+    options.enable_mem_pattern = config['mem_pattern']
+    spinning = "1" if config['allow_spinning'] else "0"
+    options.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    options.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    return options
+
+# ============================================
+# SESSION
+# ============================================
+
+def optimized_model(onnx_path):
+    """Path of the saved graph-optimized model, written on first use
+    
+    Saved at the EXTENDED level: the fusions are portable, while the
+    ALL level adds layout transforms tied to the CPU that wrote the file.
+    Those are cheap and are re-applied at load time.
+    """
+    path = tc.variant_path(onnx_path, "opt")
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(onnx_path):
+        # Write to a temporary name: several workers may start at once
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        tc.optimize_onnx(onnx_path, tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+class ClassifierSession:
+    """InferenceSession for the classifier plus the config it was built with
+    
+    run() and classify() are thread-safe (InferenceSession.run is).
+    """
+    
+    def __init__(self, onnx_path, config=None):
+        ort = tc._import_onnxruntime()
+        self.config = config or session_config(onnx_path)
+        self.onnx_path = onnx_path
+        options = session_options(self.config)
+        
+        start = time.perf_counter()
+        self.model_path = onnx_path
+        level = self.config['graph_optimization']
+        if self.config['save_optimized'] and level in ("extended", "all"):
+            self.model_path = optimized_model(onnx_path)
+            if level == "extended":
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options,
+                                            providers=self.config['providers'])
+        self.load_seconds = time.perf_counter() - start
+    
+    def feeds(self, tokenizer, input_ids):
+        """int64 feeds padded to the longest row, or up to its sequence bucket"""
+        buckets = self.config['sequence_buckets']
+        length = max(len(ids) for ids in input_ids)
+        target = next((b for b in buckets if b >= length), None) if buckets else None
+        batch = tokenizer.pad(
+            {'input_ids': input_ids},
+            padding='max_length' if target else 'longest',
+            max_length=target,
+            return_tensors='np',
+        )
+        return {
+            'input_ids': batch['input_ids'].astype(np.int64),
+            'attention_mask': batch['attention_mask'].astype(np.int64),
+        }
+    
+    def run(self, tokenizer, input_ids):
+        """Logits for token id lists, shape (len(input_ids), NUM_LABELS)"""
+        return self.session.run(['logits'], self.feeds(tokenizer, input_ids))[0]
+    
+    def classify(self, tokenizer, texts, sliding_window=False):
+        """Probabilities for texts, shape (len(texts), NUM_LABELS)"""
+        input_ids, owners = tc.encode_texts(tokenizer, texts, sliding_window)
+        logits = self.run(tokenizer, input_ids)
+        return tc.softmax(tc.pool_chunk_logits(logits, owners, len(texts)))
+
+def load_session(onnx_path=tc.ONNX_PATH, use_tuned=True, **overrides):
+    """ClassifierSession with this host's tuned settings (see session_config)"""
+    return ClassifierSession(onnx_path, session_config(onnx_path, use_tuned, **overrides))
+
+# ============================================
+# AUTOTUNE
+# ============================================
+
+def sweep_values(cores):
+    """Candidate values per setting, swept one setting at a time"""
+    threads = sorted({1, max(1, cores // 2), cores})
+    return {
+        'graph_optimization': ["basic", "extended", "all"],
+        'intra_op_threads': threads,
+        'inter_op_threads': [1, 2] if cores >= 4 else [1],
+        'allow_spinning': [True, False],
+        'cpu_mem_arena': [True, False],
+        'mem_pattern': [True, False],
+        'sequence_buckets': [None, (64, 128, tc.MAX_LENGTH), (tc.MAX_LENGTH,)],
+    }
+
+def measure_session(onnx_path, config, tokenizer, input_ids, batch_size=AUTOTUNE_BATCH_SIZE,
+                    repeats=AUTOTUNE_REPEATS, latency_samples=AUTOTUNE_LATENCY_SAMPLES):
+    """Batched emails/sec (median of repeats), single-email latency and the logits"""
+    session = ClassifierSession(onnx_path, config)
+    session.run(tokenizer, input_ids[:batch_size])  # warm-up
+    
+    rates = []
+    for _ in range(repeats):
+        logits = []
+        start = time.perf_counter()
+        for offset in range(0, len(input_ids), batch_size):
+            logits.append(session.run(tokenizer, input_ids[offset:offset + batch_size]))
+        rates.append(len(input_ids) / (time.perf_counter() - start))
+    
+    latencies = []
+    for ids in input_ids[:latency_samples]:
+        start = time.perf_counter()
+        session.run(tokenizer, [ids])
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    return {
+        'samples_per_sec': statistics.median(rates),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'load_seconds': session.load_seconds,
+    }, np.concatenate(logits)
+
+def autotune(onnx_path=tc.ONNX_PATH, tokenizer_path=tc.OUTPUT_DIR, report_path=TUNED_CONFIG_PATH,
+             objective="throughput", samples=AUTOTUNE_SAMPLES, repeats=AUTOTUNE_REPEATS,
+             batch_size=AUTOTUNE_BATCH_SIZE):
+    """Sweep session settings on the test split and record the fastest for this host
+    
+    Coordinate descent: each setting is swept in turn with the others at their
+    best value so far, which takes a few dozen sessions instead of the full
+    grid. A value only wins if it beats the best by AUTOTUNE_MIN_GAIN, so run
+    to run noise doesn't pick settings. Configs whose logits drift past ONNX_LOGIT_TOLERANCE from ONNX
+    Runtime's defaults are rejected. objective is "throughput" (batched
+    emails/sec) or "latency" (single-email p50).
+    """
+    tokenizer = tc.load_tokenizer(tokenizer_path)
+    test_dataset = tc.load_tokenized_dataset(tokenizer, dynamic_padding=True)['test']
+    input_ids = test_dataset[:samples]['input_ids']
+    key = host_key()
+    
+    print("=" * 50)
+    print("ONNX Runtime Session Autotune")
+    print("=" * 50)
+    print(f"Model: {onnx_path}")
+    print(f"Host: {key}")
+    print(f"{len(input_ids)} test emails, batches of {batch_size}, objective: {objective}")
+    
+    def label(config):
+        return ", ".join(f"{name}={config[name]}" for name in sweep_values(1))
+    
+    # ONNX Runtime's own defaults, for the speedup and the parity reference
+    baseline_config = {**default_config(), 'intra_op_threads': 0, 'graph_optimization': "all",
+                       'cpu_mem_arena': True, 'mem_pattern': True, 'allow_spinning': True,
+                       'inter_op_threads': 0, 'sequence_buckets': None, 'save_optimized': False}
+    print("\nMeasuring onnxruntime defaults...")
+    baseline, reference = measure_session(onnx_path, baseline_config, tokenizer, input_ids,
+                                          batch_size, repeats)
+    print(f"  {baseline['samples_per_sec']:.1f} emails/sec, p50 {baseline['latency_ms_p50']:.2f} ms")
+    
+    trials = {}
+    
+    def trial(config):
+        name = label(config)
+        if name not in trials:
+            result, logits = measure_session(onnx_path, config, tokenizer, input_ids,
+                                             batch_size, repeats)
+            result['max_abs_diff'] = float(np.abs(logits - reference).max())
+            result['parity_ok'] = result['max_abs_diff'] <= tc.ONNX_LOGIT_TOLERANCE
+            trials[name] = {'config': dict(config), **result}
+            print(f"  {result['samples_per_sec']:>8.1f} emails/s  p50 {result['latency_ms_p50']:>7.2f} ms"
+                  f"{'' if result['parity_ok'] else '  (logits differ, rejected)'}  {name}")
+        return trials[name]
+    
+    def faster(result, than):
+        if objective == "throughput":
+            return result['samples_per_sec'] > than['samples_per_sec'] * (1 + AUTOTUNE_MIN_GAIN)
+        return result['latency_ms_p50'] * (1 + AUTOTUNE_MIN_GAIN) < than['latency_ms_p50']
+    
+    best = default_config()
+    best_trial = trial(best)
+    for setting, values in sweep_values(tc.available_cores()).items():
+        print(f"\nSweeping {setting}: {values}")
+        for value in values:
+            result = trial({**best, setting: value})
+            if result['parity_ok'] and faster(result, best_trial):
+                best, best_trial = result['config'], result
+    
+    speedup = best_trial['samples_per_sec'] / baseline['samples_per_sec']
+    latency_speedup = baseline['latency_ms_p50'] / best_trial['latency_ms_p50']
+    print(f"\nFastest config: {label(best)}")
+    print(f"  {best_trial['samples_per_sec']:.1f} emails/sec ({speedup:.2f}x onnxruntime defaults), "
+          f"p50 {best_trial['latency_ms_p50']:.2f} ms ({latency_speedup:.2f}x)")
+    
+    entry = {
+        'onnx_path': onnx_path,
+        'size_mb': tc.onnx_size_mb(onnx_path),
+        'objective': objective,
+        'samples': len(input_ids),
+        'batch_size': batch_size,
+        'tuned_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'config': best,
+        **{k: best_trial[k] for k in ('samples_per_sec', 'latency_ms_p50', 'latency_ms_p99')},
+        'throughput_speedup': speedup,
+        'latency_speedup': latency_speedup,
+        'baseline': baseline,
+        'trials': list(trials.values()),
+    }
+    report = {}
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            report = json.load(f)
+    report.setdefault(key, {})[model_version(onnx_path)] = entry
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Tuned config saved to {report_path}")
+    return entry
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tune ONNX Runtime session settings for this host")
+    parser.add_argument("--model", default=tc.ONNX_PATH, help="ONNX model")
+    parser.add_argument("--tokenizer", default=tc.OUTPUT_DIR)
+    parser.add_argument("--output", default=TUNED_CONFIG_PATH, help="Tuned configs (JSON)")
+    parser.add_argument("--objective", choices=["throughput", "latency"], default="throughput",
+                        help="Batched emails/sec, or single-email p50 latency")
+    parser.add_argument("--samples", type=int, default=AUTOTUNE_SAMPLES,
+                        help="Test-split emails per timed run")
+    parser.add_argument("--repeats", type=int, default=AUTOTUNE_REPEATS)
+    parser.add_argument("--batch-size", type=int, default=AUTOTUNE_BATCH_SIZE)
+    parser.add_argument("--show", action="store_true",
+                        help="Print the config load_session would use and exit")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.model):
+        print(f"{args.model} not found (run export first)", file=sys.stderr)
+        return 1
+    
+    if args.show:
+        tuned = tuned_config(args.model, args.output)
+        print(f"Host: {host_key()}")
+        print(f"Tuned config: {'found in ' + args.output if tuned else 'none (using defaults)'}")
+        print(json.dumps(session_config(args.model, tuned_path=args.output), indent=2))
+        return 0
+    autotune(args.model, args.tokenizer, args.output, args.objective, args.samples,
+             args.repeats, args.batch_size)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
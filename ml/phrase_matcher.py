@@ -0,0 +1,347 @@
+"""
+Aho-Corasick Phrase Matcher for Keyword-Based Email Classification
+Reference engine for the rule-based scorers: compiles every phrase table
+(emailClassifier.js keywords/negative signals, the Gmail scan keyword lists,
+or a learned keyword_weights.json) into one automaton that scores an email in
+a single pass over its text, instead of one substring search per phrase.
+"""
+
+import argparse
+import csv
+import json
+import re
+import time
+from collections import deque
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+CLASSIFIER_JS_PATH = "../src/lib/emailClassifier.js"
+SCAN_ROUTE_JS_PATH = "../src/app/api/gmail/scan/route.js"
+DATASET_PATH = "./job_emails_dataset.csv"
+AUTOMATON_PATH = "./phrase_automaton.json"
+
+# Tables the JS code checks with text.toLowerCase().includes(phrase)
+CLASSIFIER_TABLES = ["CATEGORY_KEYWORDS", "NEGATIVE_SIGNALS"]
+SCAN_TABLES = [
+    "CONFIRMATION_KEYWORDS", "INTERVIEW_KEYWORDS", "OFFER_KEYWORDS",
+    "REJECTION_KEYWORDS", "STATUS_KEYWORDS", "EXCLUDE_KEYWORDS",
+]
+
+# ============================================
+# PHRASE TABLES
+# ============================================
+
+def _extract_block(source, name):
+    """Source text of the {...} or [...] literal assigned to `const name`"""
+    match = re.search(rf"const\s+{name}\s*=\s*([\[{{])", source)
+    if not match:
+        raise ValueError(f"const {name} not found")
+    start = match.start(1)
+    depth = 0
+    for i in range(start, len(source)):
+        if source[i] in "[{":
+            depth += 1
+        elif source[i] in "]}":
+            depth -= 1
+            if depth == 0:
+                return source[start:i + 1]
+    raise ValueError(f"Unterminated literal for const {name}")
+
+_STRING = r"'((?:[^'\\]|\\.)*)'"
+_ENTRY = re.compile(_STRING + r"\s*:\s*(-?[\d.]+)")
+_SUB_BLOCK = re.compile(r"(\w+)\s*:\s*([\[{][^\[\]{}]*[\]}])", re.S)
+
+def _parse_phrases(block):
+    """{'phrase': weight, ...} -> dict; ['phrase', ...] -> dict with weight 1.0"""
+    if block.startswith("{"):
+        return {phrase.lower(): float(weight) for phrase, weight in _ENTRY.findall(block)}
+    return {phrase.lower(): 1.0 for phrase in re.findall(_STRING, block)}
+
+def load_js_tables(path, names):
+    """Read phrase tables from JS constants
+    
+    Flat arrays become one table each (NAME); objects of arrays or objects,
+    such as CATEGORY_KEYWORDS, become one table per key (NAME.key).
+    """
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    
+    tables = {}
+    for name in names:
+        block = _extract_block(source, name)
+        sub_blocks = _SUB_BLOCK.findall(block) if block.startswith("{") else []
+        if sub_blocks:
+            for key, sub_block in sub_blocks:
+                tables[f"{name}.{key}"] = _parse_phrases(sub_block)
+        else:
+            tables[name] = _parse_phrases(block)
+    return tables
+
+def load_weight_table(path):
+    """Tables from a keyword_weights.json file (one per category)"""
+    with open(path) as f:
+        table = json.load(f)
+    return {f"learned.{name}": phrases for name, phrases in table["keywords"].items()}
+
+# ============================================
+# AUTOMATON
+# ============================================
+
+def normalize_words(text):
+    """Whole-word form used by keyword_weights.py: ' word word ... '"""
+    return " " + " ".join(re.findall(r"[^\W\d_]+", text.lower())) + " "
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over all phrases of all tables
+    
+    Transitions are fully resolved at build time (failure links folded into
+    a DFA), so matching is one dict lookup per character. Scores follow the
+    JS semantics: each distinct phrase present adds its weight once per table.
+    With whole_words, phrases only match whole words of normalize_words(text),
+    matching keyword_weights.py.
+    """
+    
+    def __init__(self, tables=None, whole_words=False):
+        self.whole_words = whole_words
+        self.table_names = []
+        self.phrases = []
+        self.entries = []  # per phrase: [(table index, weight), ...]
+        self.goto = [{}]
+        self.fail = [0]
+        self.delta = [{}]
+        self.outputs = [()]
+        if tables:
+            self._build(tables)
+    
+    def _build(self, tables):
+        self.table_names = list(tables)
+        phrase_ids = {}
+        for t, name in enumerate(self.table_names):
+            for phrase, weight in tables[name].items():
+                key = f" {phrase} " if self.whole_words else phrase
+                if key not in phrase_ids:
+                    phrase_ids[key] = len(self.phrases)
+                    self.phrases.append(key)
+                    self.entries.append([])
+                self.entries[phrase_ids[key]].append((t, weight))
+        
+        # Trie
+        goto = [{}]
+        terminal = [[]]
+        for pid, phrase in enumerate(self.phrases):
+            state = 0
+            for ch in phrase:
+                if ch not in goto[state]:
+                    goto[state][ch] = len(goto)
+                    goto.append({})
+                    terminal.append([])
+                state = goto[state][ch]
+            terminal[state].append(pid)
+        
+        # BFS: failure links and merged outputs
+        fail = [0] * len(goto)
+        outputs = [tuple(t) for t in terminal]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = tuple(terminal[state]) + outputs[fail[state]]
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                queue.append(nxt)
+        
+        self.goto = goto
+        self.fail = fail
+        self.outputs = outputs
+        self.delta = self._resolve_transitions(goto, fail)
+    
+    @staticmethod
+    def _resolve_transitions(goto, fail):
+        """Fold failure links into a full transition table (BFS order)"""
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            # Inherit the failure state's transitions, then override with own edges
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(goto[state])
+            queue.extend(goto[state].values())
+        return delta
+    
+    @property
+    def num_states(self):
+        return len(self.delta)
+    
+    def find(self, text):
+        """Set of phrase ids occurring in text (single pass)"""
+        if self.whole_words:
+            text = normalize_words(text)
+        else:
+            text = text.lower()
+        
+        delta = self.delta
+        outputs = self.outputs
+        found = set()
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+    
+    def score(self, text):
+        """{table name: sum of weights of the table's phrases present in text}"""
+        scores = [0.0] * len(self.table_names)
+        for pid in self.find(text):
+            for t, weight in self.entries[pid]:
+                scores[t] += weight
+        return dict(zip(self.table_names, scores))
+    
+    def matches(self, text):
+        """{table name: [phrases present]}, e.g. for signal logging"""
+        result = {name: [] for name in self.table_names}
+        for pid in sorted(self.find(text)):
+            phrase = self.phrases[pid].strip() if self.whole_words else self.phrases[pid]
+            for t, _ in self.entries[pid]:
+                result[self.table_names[t]].append(phrase)
+        return result
+    
+    # Serialization
+    
+    def to_dict(self):
+        return {
+            "version": 1,
+            "whole_words": self.whole_words,
+            "tables": self.table_names,
+            "phrases": self.phrases,
+            "entries": self.entries,
+            # Trie edges and failure links; the full transition table is
+            # rebuilt on load
+            "goto": self.goto,
+            "fail": self.fail,
+            "outputs": self.outputs,
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        matcher = cls(whole_words=data["whole_words"])
+        matcher.table_names = data["tables"]
+        matcher.phrases = data["phrases"]
+        matcher.entries = [[tuple(e) for e in entries] for entries in data["entries"]]
+        matcher.goto = data["goto"]
+        matcher.fail = data["fail"]
+        matcher.outputs = [tuple(out) for out in data["outputs"]]
+        matcher.delta = cls._resolve_transitions(matcher.goto, matcher.fail)
+        return matcher
+    
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"), ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+# ============================================
+# BENCHMARK
+# ============================================
+
+def naive_score(text, tables, whole_words=False):
+    """The current JS approach: one substring search per phrase per table"""
+    text = normalize_words(text) if whole_words else text.lower()
+    scores = {}
+    for name, phrases in tables.items():
+        score = 0.0
+        for phrase, weight in phrases.items():
+            if (f" {phrase} " if whole_words else phrase) in text:
+                score += weight
+        scores[name] = score
+    return scores
+
+def load_texts(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+def benchmark(matcher, tables, texts):
+    """Time naive vs automaton scoring over texts and check they agree"""
+    start = time.perf_counter()
+    naive = [naive_score(text, tables, matcher.whole_words) for text in texts]
+    naive_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    compiled = [matcher.score(text) for text in texts]
+    compiled_seconds = time.perf_counter() - start
+    
+    mismatches = sum(
+        1 for a, b in zip(naive, compiled)
+        if any(abs(a[name] - b[name]) > 1e-9 for name in tables)
+    )
+    
+    chars = sum(len(text) for text in texts)
+    num_phrases = sum(len(phrases) for phrases in tables.values())
+    print(f"\n{len(texts):,} emails, {chars:,} chars, {num_phrases} phrases "
+          f"in {len(tables)} tables, {matcher.num_states:,} automaton states")
+    print(f"  naive loop: {len(texts) / naive_seconds:>10,.0f} emails/sec "
+          f"({naive_seconds / len(texts) * 1e6:.1f} us/email)")
+    print(f"  automaton:  {len(texts) / compiled_seconds:>10,.0f} emails/sec "
+          f"({compiled_seconds / len(texts) * 1e6:.1f} us/email)")
+    print(f"  speedup:    {naive_seconds / compiled_seconds:.2f}x")
+    print(f"  score mismatches: {mismatches}")
+    return {
+        "emails": len(texts),
+        "phrases": num_phrases,
+        "states": matcher.num_states,
+        "naive_emails_per_sec": len(texts) / naive_seconds,
+        "automaton_emails_per_sec": len(texts) / compiled_seconds,
+        "mismatches": mismatches,
+    }
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aho-Corasick phrase matcher")
+    parser.add_argument("--weights", metavar="JSON",
+                        help="Use a keyword_weights.json table (whole-word matching) "
+                             "instead of the JS keyword tables")
+    parser.add_argument("--dataset", default=DATASET_PATH,
+                        help="CSV to benchmark against")
+    parser.add_argument("--save", default=AUTOMATON_PATH,
+                        help="Where to write the compiled automaton")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    print("=" * 50)
+    print("Aho-Corasick Phrase Matcher")
+    print("=" * 50)
+    
+    if args.weights:
+        tables = load_weight_table(args.weights)
+        whole_words = True
+    else:
+        tables = load_js_tables(CLASSIFIER_JS_PATH, CLASSIFIER_TABLES)
+        tables.update(load_js_tables(SCAN_ROUTE_JS_PATH, SCAN_TABLES))
+        whole_words = False
+    
+    start = time.perf_counter()
+    matcher = PhraseMatcher(tables, whole_words=whole_words)
+    print(f"Compiled {len(matcher.phrases)} unique phrases from {len(tables)} tables "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    matcher.save(args.save)
+    reloaded = PhraseMatcher.load(args.save)
+    print(f"Saved automaton to {args.save}")
+    
+    benchmark(reloaded, tables, load_texts(args.dataset))
+
+if __name__ == "__main__":
+    main()
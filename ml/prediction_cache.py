@@ -0,0 +1,180 @@
+"""
+Prediction Cache for the Email Classifier
+Content-hash cache of class probabilities, keyed by normalized email text
+plus a model version, with an in-memory LRU tier and an optional SQLite tier.
+
+ATS senders mail near-identical confirmations to thousands of candidates, and
+re-scanning an inbox resubmits emails that were already classified. Cached
+emails skip tokenization and the model. stats() reports hit rates per tier
+and an estimate of the model time saved, for sizing the cache.
+
+Usage:
+    cache = PredictionCache(model_version(model_path), capacity=10_000,
+                            path="./prediction_cache.sqlite")
+    found = cache.get_many(texts)          # {index: probabilities}
+    cache.put_many(missed_texts, probs, seconds=model_time)
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ============================================
+# KEYS
+# ============================================
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace (the tokenizer is uncased)"""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+def model_version(model_path, extra=""):
+    """Short content hash of a model directory or .onnx file
+    
+    Covers weights, config and tokenizer files, plus `extra` (e.g. MAX_LENGTH),
+    so retraining or re-exporting the model invalidates its cached entries.
+    """
+    if os.path.isfile(model_path):
+        files = [model_path]
+        if os.path.exists(model_path + ".data"):
+            files.append(model_path + ".data")
+    else:
+        files = sorted(
+            os.path.join(model_path, name) for name in os.listdir(model_path)
+            if os.path.isfile(os.path.join(model_path, name))
+        )
+    digest = hashlib.blake2b(extra.encode(), digest_size=8)
+    for path in files:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+# ============================================
+# CACHE
+# ============================================
+
+class PredictionCache:
+    """Two-tier cache of probability vectors keyed by text hash and model version
+    
+    The memory tier is an LRU of at most `capacity` entries. With `path`,
+    entries are also written to a SQLite table that survives restarts and
+    is shared between processes; disk hits are promoted to memory.
+    """
+    
+    def __init__(self, version, capacity=10_000, path=None):
+        self.version = version
+        self.capacity = capacity
+        self.path = path
+        self.memory = OrderedDict()
+        self.db = None
+        if path:
+            # Callers may hand the cache to a worker thread (serve.py); it is
+            # still used from one thread at a time
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(key BLOB PRIMARY KEY, probabilities BLOB, created REAL)"
+            )
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+        self.model_seconds = 0.0
+        self.model_items = 0
+    
+    def key(self, text):
+        return hashlib.blake2b(
+            f"{self.version}\0{normalize_text(text)}".encode(), digest_size=16
+        ).digest()
+    
+    def _remember(self, key, probabilities):
+        self.memory[key] = probabilities
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+    
+    def get_many(self, texts):
+        """{index: probabilities} for the texts that are cached"""
+        start = time.perf_counter()
+        found, missing = {}, {}
+        for i, text in enumerate(texts):
+            key = self.key(text)
+            probabilities = self.memory.get(key)
+            if probabilities is not None:
+                self.memory.move_to_end(key)
+                found[i] = probabilities
+                self.memory_hits += 1
+            else:
+                missing.setdefault(key, []).append(i)
+        
+        if self.db is not None and missing:
+            keys = list(missing)
+            # SQLite caps bound parameters (999 on older builds)
+            for offset in range(0, len(keys), 500):
+                chunk = keys[offset:offset + 500]
+                rows = self.db.execute(
+                    f"SELECT key, probabilities FROM predictions WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    probabilities = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, probabilities)
+                    for i in missing.pop(key):
+                        found[i] = probabilities
+                        self.disk_hits += 1
+        
+        self.misses += sum(len(indices) for indices in missing.values())
+        self.lookup_seconds += time.perf_counter() - start
+        return found
+    
+    def put_many(self, texts, probabilities, seconds=None):
+        """Store probabilities for texts; `seconds` is the model time they took"""
+        rows = []
+        for text, row in zip(texts, probabilities):
+            key = self.key(text)
+            row = np.asarray(row, dtype=np.float32)
+            self._remember(key, row)
+            rows.append((key, row.tobytes(), time.time()))
+        if self.db is not None and rows:
+            self.db.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)", rows)
+            self.db.commit()
+        if seconds is not None:
+            self.model_seconds += seconds
+            self.model_items += len(rows)
+    
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        per_item = self.model_seconds / self.model_items if self.model_items else None
+        return {
+            "version": self.version,
+            "capacity": self.capacity,
+            "size": len(self.memory),
+            "disk_path": self.path,
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "lookup_ms_per_item": self.lookup_seconds * 1000 / lookups if lookups else None,
+            "model_ms_per_item": per_item * 1000 if per_item is not None else None,
+            # Model time the hits would have cost, minus what the lookups took
+            "seconds_saved": hits * per_item - self.lookup_seconds if per_item is not None else None,
+        }
+    
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
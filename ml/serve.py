@@ -0,0 +1,482 @@
+"""
+Local Inference Server for the Email Classifier
+asyncio HTTP server that loads the trained model (PyTorch or ONNX export)
+once and coalesces concurrent requests into micro-batches.
+
+Endpoints:
+    POST /classify   {"emails": ["...", ...]} -> one result per email
+    GET  /metrics    queue depth, batch sizes and latency histograms (JSON)
+    GET  /healthz    liveness and the loaded model
+
+Each email is queued on its own. The batcher takes up to MAX_BATCH_SIZE
+emails from the queue, waiting at most MAX_WAIT_MS for more after the first
+arrives, and runs them through the model in a worker thread. While a batch is
+running, the next one fills up, so batches grow with load. Emails found in
+the prediction cache are answered without being queued, and identical emails
+(same cache key) waiting on the model share one queue slot.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import train_classifier as tc
+from onnx_session import load_session
+from prediction_cache import PredictionCache, model_version
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOST = "127.0.0.1"
+PORT = 8765
+MODEL_PATH = tc.OUTPUT_DIR  # Model directory, or a .onnx file for ONNX Runtime
+MAX_BATCH_SIZE = 32  # Emails per model call
+MAX_WAIT_MS = 5  # How long the first email in a batch waits for company
+MAX_QUEUE_SIZE = 1024  # Queued emails before requests are rejected with 503
+MAX_EMAILS_PER_REQUEST = 256
+MAX_BODY_BYTES = 4 << 20
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# ============================================
+# BACKENDS
+# ============================================
+
+class TorchBackend:
+    """Hugging Face model directory run with PyTorch"""
+    
+    def __init__(self, model_path, sliding_window=False):
+        self.name = model_path
+        self.sliding_window = sliding_window
+        self.tokenizer, self.model = tc.load_model(model_path)
+    
+    def classify(self, texts):
+        """Probabilities, shape (len(texts), NUM_LABELS)"""
+        input_ids, owners = tc.encode_texts(self.tokenizer, texts, self.sliding_window)
+        logits, _ = tc.batched_logits(self.model, self.tokenizer, input_ids, batch_size=len(input_ids))
+        return tc.softmax(tc.pool_chunk_logits(logits.numpy(), owners, len(texts)))
+
+class OnnxBackend:
+    """ONNX export run with ONNX Runtime (tokenizer from tokenizer_path)
+    
+    Session settings come from onnx_session: this host's tuned config if
+    `onnx_session.py` has been run, else its defaults.
+    """
+    
+    def __init__(self, onnx_path, tokenizer_path=tc.OUTPUT_DIR, sliding_window=False):
+        self.name = onnx_path
+        self.sliding_window = sliding_window
+        self.tokenizer = tc.load_tokenizer(tokenizer_path)
+        self.session = load_session(onnx_path)
+    
+    def classify(self, texts):
+        return self.session.classify(self.tokenizer, texts, self.sliding_window)
+
+def load_backend(model_path=MODEL_PATH, tokenizer_path=tc.OUTPUT_DIR, sliding_window=False):
+    if model_path.endswith(".onnx"):
+        return OnnxBackend(model_path, tokenizer_path, sliding_window)
+    return TorchBackend(model_path, sliding_window)
+
+# ============================================
+# MICRO-BATCHING
+# ============================================
+
+class Histogram:
+    """Per-bucket counts (upper bounds in buckets, plus +Inf), sum and count"""
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q):
+        """Upper bucket bound containing quantile q (None when empty)"""
+        if not self.count:
+            return None
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, q * self.count))
+        return self.buckets[index] if index < len(self.buckets) else float("inf")
+    
+    def to_dict(self):
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(bounds, self.counts)),
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+class QueueFull(Exception):
+    """Raised when accepting a request would exceed MAX_QUEUE_SIZE"""
+
+class MicroBatcher:
+    """Coalesces queued emails into batches bounded by size and wait time"""
+    
+    def __init__(self, backend, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 max_queue_size=MAX_QUEUE_SIZE, cache=None):
+        self.backend = backend
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.queue = asyncio.Queue()
+        # One worker: the model runs one batch at a time, the next one fills meanwhile
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        # SQLite lookups and commits stay off the event loop, and off the
+        # inference thread so cache hits don't wait behind a batch
+        self.cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache")
+        self.cache_errors = 0
+        # Queued or running emails by cache key, and how many requests await each
+        self.pending = {}
+        self.waiters = {}
+        self.shared = 0
+        self.batches = 0
+        self.emails = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.inference_ms = Histogram(LATENCY_BUCKETS_MS)
+    
+    def _cache_get(self, texts):
+        try:
+            return self.cache.get_many(texts)
+        except Exception as e:  # e.g. "database is locked" on a shared --cache-path
+            self.cache_errors += 1
+            print(f"Prediction cache lookup failed: {e}", file=sys.stderr)
+            return {}
+    
+    def _cache_put(self, texts, probabilities, seconds):
+        try:
+            self.cache.put_many(texts, probabilities, seconds=seconds)
+        except Exception as e:
+            self.cache_errors += 1
+            print(f"Prediction cache write failed: {e}", file=sys.stderr)
+    
+    def _settled(self, key, future):
+        if self.pending.get(key) is future:
+            del self.pending[key]
+    
+    def _release(self, future):
+        """Drop one request's claim; an email nobody awaits any more is skipped by run()"""
+        self.waiters[future] -= 1
+        if not self.waiters[future]:
+            del self.waiters[future]
+            future.cancel()  # no-op once the result is set
+    
+    async def classify(self, texts):
+        """Probabilities for texts, once every uncached email's batch has run
+        
+        Cache failures only cost the hits: the emails go to the model instead.
+        Emails with the same cache key, in this request or another one still
+        in flight, are queued once and share the result.
+        """
+        cached = {}
+        if self.cache:
+            cached = await asyncio.get_running_loop().run_in_executor(
+                self.cache_executor, self._cache_get, texts
+            )
+        misses = [i for i in range(len(texts)) if i not in cached]
+        keys = [self.cache.key(texts[i]) if self.cache else texts[i] for i in misses]
+        first = {}
+        for i, key in zip(misses, keys):
+            first.setdefault(key, i)
+        new = [key for key in first
+               if key not in self.pending or self.pending[key].cancelled()]
+        if self.queue.qsize() + len(new) > self.max_queue_size:
+            raise QueueFull(f"queue full ({self.queue.qsize()} emails waiting)")
+        loop = asyncio.get_running_loop()
+        for key in new:
+            future = self.pending[key] = loop.create_future()
+            future.add_done_callback(lambda f, key=key: self._settled(key, f))
+            self.queue.put_nowait((texts[first[key]], future, time.perf_counter()))
+        self.shared += len(misses) - len(new)
+        futures = {key: self.pending[key] for key in first}
+        for future in futures.values():
+            self.waiters[future] = self.waiters.get(future, 0) + 1
+        try:
+            # Shielded: a request going away mustn't cancel emails others await
+            rows = await asyncio.gather(*(asyncio.shield(f) for f in futures.values()))
+        finally:
+            for future in futures.values():
+                self._release(future)
+        results = dict(zip(futures, rows))
+        for i, key in zip(misses, keys):
+            cached[i] = results[key]
+        return [cached[i] for i in range(len(texts))]
+    
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Skip emails whose request has gone away
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+            
+            start = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((start - enqueued) * 1000)
+            try:
+                probabilities = await loop.run_in_executor(
+                    self.executor, self.backend.classify, [text for text, _, _ in batch]
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+            self.inference_ms.observe(elapsed * 1000)
+            self.batch_sizes.observe(len(batch))
+            self.batches += 1
+            self.emails += len(batch)
+            for (_, future, _), row in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result(row)
+            if self.cache:
+                # Not awaited: the next batch needn't wait for the commit
+                loop.run_in_executor(self.cache_executor, self._cache_put,
+                                     [text for text, _, _ in batch], probabilities, elapsed)
+    
+    def metrics(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "batches": self.batches,
+            "emails": self.emails,
+            "shared_emails": self.shared,
+            "mean_batch_size": self.emails / self.batches if self.batches else None,
+            "batch_size": self.batch_sizes.to_dict(),
+            "queue_wait_ms": self.queue_wait_ms.to_dict(),
+            "inference_ms": self.inference_ms.to_dict(),
+            "cache": {**self.cache.stats(), "errors": self.cache_errors} if self.cache else None,
+        }
+
+# ============================================
+# HTTP
+# ============================================
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+def format_result(row):
+    label_id = int(np.argmax(row))
+    return {
+        "label": tc.LABEL_NAMES[label_id],
+        "label_id": label_id,
+        "confidence": float(row[label_id]),
+        "probabilities": {name: float(p) for name, p in zip(tc.LABEL_NAMES, row)},
+    }
+
+def parse_emails(body):
+    """Email texts from a {"emails": [...]} (or bare list) JSON body"""
+    try:
+        payload = json.loads(body or b"null")
+    except (ValueError, UnicodeDecodeError):
+        raise HttpError(400, "body must be JSON")
+    emails = payload.get("emails") if isinstance(payload, dict) else payload
+    if not isinstance(emails, list) or not all(isinstance(e, str) for e in emails):
+        raise HttpError(400, 'expected {"emails": [string, ...]}')
+    if len(emails) > MAX_EMAILS_PER_REQUEST:
+        raise HttpError(413, f"at most {MAX_EMAILS_PER_REQUEST} emails per request")
+    return emails
+
+class InferenceServer:
+    """Routes HTTP/1.1 requests (keep-alive) to the micro-batcher"""
+    
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.request_ms = Histogram(LATENCY_BUCKETS_MS)
+    
+    async def handle(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/classify":
+            if method != "POST":
+                raise HttpError(405, "use POST")
+            start = time.perf_counter()
+            emails = parse_emails(body)
+            try:
+                probabilities = await self.batcher.classify(emails)
+            except QueueFull as e:
+                raise HttpError(503, str(e))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.request_ms.observe(elapsed_ms)
+            return {
+                "model": self.batcher.backend.name,
+                "results": [format_result(row) for row in probabilities],
+                "latency_ms": elapsed_ms,
+            }
+        if method != "GET":
+            raise HttpError(405, "use GET")
+        if path == "/metrics":
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "requests": self.requests,
+                "errors": self.errors,
+                "request_ms": self.request_ms.to_dict(),
+                **self.batcher.metrics(),
+            }
+        if path == "/healthz":
+            return {"status": "ok", "model": self.batcher.backend.name}
+        raise HttpError(404, f"no route {path}")
+    
+    async def connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                # HTTP/1.1 defaults to keep-alive, HTTP/1.0 to close
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                
+                self.requests += 1
+                status = 200
+                try:
+                    # The body can't be framed without a valid length, so close after replying
+                    length = headers.get("content-length", "0")
+                    if not (length.isascii() and length.isdigit()):
+                        keep_alive = False
+                        raise HttpError(400, "Content-Length must be a non-negative integer")
+                    length = int(length)
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HttpError(413, f"body over {MAX_BODY_BYTES} bytes")
+                    body = await reader.readexactly(length) if length else b""
+                    response = await self.handle(method, path, body)
+                except HttpError as e:
+                    status, response = e.status, {"error": str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+                if status != 200:
+                    self.errors += 1
+                
+                payload = json.dumps(response).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(model_path=MODEL_PATH, host=HOST, port=PORT, max_batch_size=MAX_BATCH_SIZE,
+                max_wait_ms=MAX_WAIT_MS, max_queue_size=MAX_QUEUE_SIZE, tokenizer_path=tc.OUTPUT_DIR,
+                cache_size=tc.PREDICTION_CACHE_SIZE, cache_path=tc.PREDICTION_CACHE_PATH,
+                sliding_window=tc.SLIDING_WINDOW):
+    """Load the model, warm it up and serve until cancelled"""
+    print(f"Loading {model_path}...")
+    backend = load_backend(model_path, tokenizer_path, sliding_window)
+    backend.classify(["warmup"] * min(max_batch_size, 2))
+    cache = None
+    if cache_size:
+        cache = PredictionCache(model_version(model_path, extra=tc.inference_signature(sliding_window)),
+                                capacity=cache_size, path=cache_path)
+    
+    batcher = MicroBatcher(backend, max_batch_size, max_wait_ms, max_queue_size, cache)
+    server = InferenceServer(batcher)
+    batch_task = asyncio.create_task(batcher.run())
+    http = await asyncio.start_server(server.connection, host, port)
+    print(f"Serving {backend.name} on http://{host}:{port} "
+          f"(batches of up to {max_batch_size}, {max_wait_ms} ms max wait)")
+    try:
+        async with http:
+            await http.serve_forever()
+    finally:
+        batch_task.cancel()
+        batcher.executor.shutdown(wait=False)
+        batcher.cache_executor.shutdown(wait=True)
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP inference server")
+    parser.add_argument("--model", default=MODEL_PATH,
+                        help="Model directory, or a .onnx file to run with ONNX Runtime")
+    parser.add_argument("--tokenizer", default=tc.OUTPUT_DIR, help="Tokenizer for .onnx models")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--max-queue-size", type=int, default=MAX_QUEUE_SIZE)
+    parser.add_argument("--sliding-window", action="store_true", default=tc.SLIDING_WINDOW,
+                        help="Classify long emails in overlapping chunks instead of truncating")
+    parser.add_argument("--cache-size", type=int, default=tc.PREDICTION_CACHE_SIZE,
+                        help="In-memory prediction cache entries (0: no cache)")
+    parser.add_argument("--cache-path", default=tc.PREDICTION_CACHE_PATH,
+                        help="SQLite file for a persistent prediction cache")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.model):
+        raise SystemExit(f"{args.model} not found (train or export first)")
+    try:
+        asyncio.run(serve(args.model, args.host, args.port, args.max_batch_size,
+                          args.max_wait_ms, args.max_queue_size, args.tokenizer,
+                          args.cache_size, args.cache_path, args.sliding_window))
+    except KeyboardInterrupt:
+        print("\nShutting down")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import { NextResponse } from 'next/server';
 import { createClient } from '@supabase/supabase-js';
 import { cookies } from 'next/headers';
-import { hybridClassify, classifyEmail } from '@/lib/emailClassifier';
+import { readFileSync } from 'fs';
+import { hybridClassify, classifyEmail, loadKeywordWeights } from '@/lib/emailClassifier';
 import { checkRateLimit, rateLimitHeaders } from '@/lib/rateLimit';
 
 const supabaseUrl = process.env.NEXT_PUBLIC_SUPABASE_URL;
@@ -136,6 +137,17 @@ const INPUT_LIMITS = {
 // Model versioning for tracking predictions
 const ML_MODEL_VERSION = 'v1.0.0';
 
+// Learned keyword weights from ml/keyword_weights.py (unset: hand-tuned tables)
+const KEYWORD_WEIGHTS_PATH = process.env.KEYWORD_WEIGHTS_PATH;
+if (KEYWORD_WEIGHTS_PATH) {
+    try {
+        loadKeywordWeights(JSON.parse(readFileSync(KEYWORD_WEIGHTS_PATH, 'utf8')));
+        console.log(`[CLASSIFIER] Loaded learned keyword weights from ${KEYWORD_WEIGHTS_PATH}`);
+    } catch (error) {
+        console.error('[CLASSIFIER] Failed to load keyword weights, using hand-tuned tables:', error);
+    }
+}
+
 // Observability tracking
 const scanMetrics = {
     totalScans: 0,
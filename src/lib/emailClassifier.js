@@ -175,14 +175,58 @@ const SENDER_BONUSES = {
     'icici': { applied: -5, interview: -5, rejection: -5, not_job: 5 },
 };
 
+// Optional learned weight table produced by ml/keyword_weights.py
+let learnedWeights = null;
+
+/**
+ * Score with a learned weight table instead of the hand-tuned
+ * CATEGORY_KEYWORDS / NEGATIVE_SIGNALS / SENDER_BONUSES tables.
+ * Pass null to revert.
+ *
+ * @param {Object|null} table - Parsed keyword_weights.json
+ */
+export function loadKeywordWeights(table) {
+    learnedWeights = table;
+}
+
 // ============================================
 // CLASSIFICATION FUNCTIONS
 // ============================================
 
+/**
+ * Lowercased letter-only words joined by single spaces and padded with a
+ * space on each side, so ` ${phrase} ` only matches whole words
+ * (mirrors normalize_text in ml/keyword_weights.py)
+ */
+function normalizeForPhrases(text) {
+    const words = text.toLowerCase().match(/\p{L}+/gu) || [];
+    return ` ${words.join(' ')} `;
+}
+
+/**
+ * Learned score: intercept + weights of the phrases present in the text
+ */
+function calculateLearnedScore(text, category) {
+    const normalized = normalizeForPhrases(text);
+    let score = learnedWeights.intercepts[category] || 0;
+
+    for (const [phrase, weight] of Object.entries(learnedWeights.keywords[category] || {})) {
+        if (normalized.includes(` ${phrase} `)) {
+            score += weight;
+        }
+    }
+
+    return score;
+}
+
 /**
  * Calculate similarity score between text and category
  */
 function calculateCategoryScore(text, category) {
+    if (learnedWeights) {
+        return calculateLearnedScore(text, category);
+    }
+
     const textLower = text.toLowerCase();
     let score = 0;
 
@@ -247,8 +291,11 @@ export function classifyEmail(text, from = '') {
     // Calculate raw scores for each category
     let scores = CATEGORY_NAMES.map(cat => calculateCategoryScore(text, cat));
 
-    // Apply sender bonuses
-    scores = applySenderBonus(from, scores);
+    // Apply sender bonuses (hand-tuned for the heuristic scale; learned
+    // scores are calibrated logits, so the ±5 nudges would swamp them)
+    if (!learnedWeights) {
+        scores = applySenderBonus(from, scores);
+    }
 
     // Convert to probabilities
     const probabilities = softmax(scores);
@@ -375,5 +422,6 @@ export default {
     classifyEmail,
     hybridClassify,
     classifyEmails,
+    loadKeywordWeights,
     CATEGORY_NAMES,
 };